@@ -1,5 +1,10 @@
 from bs4 import BeautifulSoup
 from pathlib import Path
+from multiprocessing import Pool
+import argparse
+import time
+
+from hypotactic_html import timed_extract_formatted_lines
 
 def format_meter_line(line_div):
     formatted_line = []
@@ -15,23 +20,50 @@ def format_meter_line(line_div):
             formatted_line.append(formatted_word)
     return ' '.join(formatted_line)
 
-# === Main script ===
-input_dir = Path('hypotactic_htmls_greek')
-output_file = Path('hypotactic_all_raw.txt')
-
-all_formatted_lines = []
-
-for html_file in input_dir.glob('*.html'):
-    print(f"Processing {html_file.name}")
+def timed_soup_formatted_lines(html_file):
+    start = time.perf_counter()
     with open(html_file, encoding='utf-8') as f:
         soup = BeautifulSoup(f, 'html.parser')
+    lines = []
     for line_div in soup.select('div.line'):
         formatted = format_meter_line(line_div)
         if formatted.strip():
-            all_formatted_lines.append(formatted)
+            lines.append(formatted)
+    return html_file.name, lines, time.perf_counter() - start
+
+# === Main script ===
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Extract bracket-scanned lines from the Hypotactic HTML files.')
+    parser.add_argument('--streaming', action='store_true', help='use the streaming event parser instead of BeautifulSoup')
+    parser.add_argument('--jobs', type=int, default=1, help='number of worker processes (streaming mode only)')
+    args = parser.parse_args()
+
+    input_dir = Path('hypotactic_htmls_greek')
+    output_file = Path('hypotactic_all_raw.txt')
+
+    # Sorted, so that the output order does not depend on the file system
+    html_files = sorted(input_dir.glob('*.html'))
+    worker = timed_extract_formatted_lines if args.streaming else timed_soup_formatted_lines
 
-# Write to output
-with open(output_file, 'w', encoding='utf-8') as f:
-    f.write('\n'.join(all_formatted_lines))
+    start = time.perf_counter()
+    line_count = 0
+    with open(output_file, 'w', encoding='utf-8') as f:
+        if args.streaming and args.jobs > 1:
+            pool = Pool(args.jobs)
+            results = pool.imap(worker, html_files)  # imap keeps input order
+        else:
+            pool = None
+            results = map(worker, html_files)
+        for name, lines, seconds in results:
+            print(f"Processed {name}: {len(lines)} lines in {seconds:.2f}s")
+            for formatted in lines:
+                # Separator before every line but the first, i.e. the same as '\n'.join(...)
+                if line_count:
+                    f.write('\n')
+                f.write(formatted)
+                line_count += 1
+        if pool is not None:
+            pool.close()
+            pool.join()
 
-print(f"✅ Done. Output saved to {output_file}")
\ No newline at end of file
+    print(f"✅ Done. {line_count} lines in {time.perf_counter() - start:.2f}s. Output saved to {output_file}")
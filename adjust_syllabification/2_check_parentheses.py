@@ -1,77 +1,61 @@
-def check_unclosed_parentheses(file_path, output_file=None):
-    try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            lines = file.readlines()
-            # Stack to track opening brackets and their line numbers
-            stack = []
-            # List to collect all errors
-            errors = []
-            # Set to track lines with errors
-            error_lines = set()
-            # Dictionary to map closing brackets to their corresponding opening brackets
-            brackets = {')': '(', ']': '[', '}': '{'}
-            # Valid opening brackets
-            opening = set(['(', '[', '{'])
-            
-            for line_num, line in enumerate(lines, 1):  # 1-based line numbering
-                for char in line:
-                    if char in opening:
-                        stack.append((char, line_num))
-                    elif char in brackets:
-                        if not stack:
-                            errors.append(f"Unmatched closing bracket '{char}' found at line {line_num}:")
-                            errors.append(f"  {line.strip()}")
-                            error_lines.add(line_num)
-                        elif stack[-1][0] != brackets[char]:
-                            errors.append(f"Mismatched bracket at line {line_num}: Expected closing for '{stack[-1][0]}' (opened at line {stack[-1][1]}) but found '{char}':")
-                            errors.append(f"  {line.strip()}")
-                            error_lines.add(line_num)
-                            stack.pop()  # Remove the mismatched opening bracket
-                        else:
-                            stack.pop()  # Valid match, remove the opening bracket
-            
-            # Check for unclosed opening brackets
-            if stack:
-                errors.append("Unclosed opening bracket(s) found:")
-                for bracket, line_num in stack:
-                    errors.append(f" '{bracket}' at line {line_num}:")
-                    errors.append(f"  {lines[line_num-1].strip()}")
-                    error_lines.add(line_num)
-            
-            # Print errors
-            if errors:
-                for error in errors:
-                    print(error)
-            else:
-                print("All brackets are properly closed.")
-            
-            # Remove lines with errors and save to output file
-            removed_count = len(error_lines)
-            if removed_count > 0:
-                # Create new content excluding error lines
-                new_lines = [line for i, line in enumerate(lines, 1) if i not in error_lines]
-                
-                # If no output file specified, create one with '_cleaned' suffix
-                if output_file is None:
-                    output_file = file_path.rsplit('.', 1)[0] + '_cleaned.txt'
-                
-                with open(output_file, 'w', encoding='utf-8') as file:
-                    file.writelines(new_lines)
-                
-                print(f"Removed {removed_count} line(s) with bracket errors.")
-                print(f"Cleaned file saved as '{output_file}'.")
-            else:
-                print("No lines were removed.")
-            
-            return not errors  # Return True if no errors, False otherwise
-    
-    except FileNotFoundError:
-        print(f"Error: File '{file_path}' not found.")
-        return False
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return False
+'''
+Removes the lines with bracket errors, e.g. an unclosed [, from the reshuffled corpus.
 
-input_file = 'hypotactic_all_raw.txt'
-output_file = 'hypotactic_all_shuffled.txt'
-check_unclosed_parentheses(output_file)
\ No newline at end of file
+The brackets of every line are checked on their own (see brackets.py), so one bad line is dropped
+alone instead of taking the following lines with it, and the file is streamed through, so memory
+use stays the same however large it is. The rejected lines are not printed but written to a
+sidecar file, one JSON record per line with the reason and the line number in the input, e.g.
+
+{"line": 1234, "reason": "unclosed", "column": 15, "bracket": "[", "message": "Unclosed opening bracket '[' at column 15", "text": "[ὦ] [παῖ] {τέ}[λος"}
+
+A line with several errors gets one record per error.
+'''
+
+import argparse
+import json
+
+import tracing
+from brackets import check_lines
+from tracing import tracer
+
+input_file = 'hypotactic_all_shuffled.txt'
+output_file = 'hypotactic_all_shuffled_cleaned.txt'
+rejects_file = 'hypotactic_all_shuffled_rejects.jsonl'
+
+
+def check_file(input_file, output_file, rejects_file, jobs=1):
+    '''
+    Copies the lines of input_file without bracket errors to output_file, and the errors to rejects_file.
+    Returns the numbers of kept and rejected lines.
+    '''
+    kept = 0
+    rejected = 0
+    with open(input_file, 'r', encoding='utf-8') as f, \
+            open(output_file, 'w', encoding='utf-8') as out, \
+            open(rejects_file, 'w', encoding='utf-8') as rejects:
+        for line_num, (line, errors) in enumerate(check_lines(f, jobs), 1):
+            if not errors:
+                out.write(line)
+                kept += 1
+                continue
+            rejected += 1
+            for error in errors:
+                rejects.write(json.dumps({'line': line_num, **error._asdict(), 'text': line.rstrip('\n')}, ensure_ascii=False) + '\n')
+            tracer.record(stage='brackets', line=line_num, input=line.rstrip('\n'), errors=[error.message for error in errors])
+    return kept, rejected
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Remove the lines with bracket errors from the reshuffled corpus.')
+    parser.add_argument('input', nargs='?', default=input_file, help=f'default: {input_file}')
+    parser.add_argument('output', nargs='?', default=output_file, help=f'default: {output_file}')
+    parser.add_argument('--rejects', default=rejects_file, help=f'where to write the rejected lines (default: {rejects_file})')
+    parser.add_argument('--jobs', type=int, default=1, help='number of worker processes; the output is the same as with one')
+    tracing.add_arguments(parser)
+    args = parser.parse_args()
+    tracing.configure(args)
+
+    kept, rejected = check_file(args.input, args.output, args.rejects, args.jobs)
+    tracer.info(f"Kept {kept} line(s), removed {rejected} line(s) with bracket errors (see {args.rejects}).")
+    tracer.count('bracket_errors', rejected)
+    tracing.finish(args)
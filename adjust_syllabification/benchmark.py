@@ -0,0 +1,232 @@
+'''
+Benchmarks and golden-output regression checks for every stage of the adjustment:
+HTML extraction, reshuffle, bracket check and macron harvest.
+
+Three fixtures:
+
+small   the *_test.txt files, each fed to the stage it is the input of, plus the smallest HTML file
+medium  a handful of works of different genres, chained through all stages
+full    all of hypotactic_htmls_greek/, chained through all stages
+
+For every stage, lines per second and peak memory (as traced by tracemalloc, in a second, untimed
+run) are measured, and the output is compared byte for byte with the golden output recorded in
+benchmark_baseline.json. The run fails if an output changed, or if a stage got slower than its
+baseline by more than --threshold. Run from the repository root:
+
+python adjust_syllabification/benchmark.py                       # small and medium
+python adjust_syllabification/benchmark.py full
+python adjust_syllabification/benchmark.py small medium full --update   # record a new baseline
+
+A deliberate change of output, or a new machine, calls for --update. The golden hashes are only
+compared when the installed grc_utils version is the one the baseline was recorded with.
+'''
+
+from collections import namedtuple
+from io import StringIO
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import tracing
+import pipeline
+from fingerprints import grc_utils_version
+from grc_cache import clear_caches
+from macron_lexicon import count_markings, write_lexicon
+from pipeline import StageStats
+from tracing import tracer
+
+HERE = Path(__file__).resolve().parent
+HTML_DIR = HERE.parent / 'hypotactic_htmls_greek'
+BASELINE_FILE = HERE / 'benchmark_baseline.json'
+
+STAGES = ['extract', 'reshuffle', 'brackets', 'macrons']
+
+# Stage runs shorter than this in the baseline are too noisy to judge throughput by
+MIN_SECONDS = 0.2
+
+'''
+html_files: the input of the extract stage
+inputs: {stage: file} for stages that read a file of their own rather than the previous stage's output
+expected: {stage: file} for stages whose output must equal a file in the repository
+'''
+Fixture = namedtuple('Fixture', ['name', 'html_files', 'inputs', 'expected'])
+
+FIXTURES = {
+    'small': Fixture(
+        'small',
+        ['cleanthes.html'],
+        {
+            'reshuffle': 'hypotactic_all_raw_test.txt',
+            'brackets': 'hypotactic_all_shuffled_test.txt',
+            'macrons': 'hypotactic_all_shuffled_cleaned_test.txt',
+        },
+        {'reshuffle': 'hypotactic_all_shuffled_test.txt'},
+    ),
+    'medium': Fixture(
+        'medium',
+        ['bion.html', 'cleanthes.html', 'iliad1.html', 'odyssey6.html', 'persians.html', 'solon.html', 'theoc4.html'],
+        {},
+        {},
+    ),
+    'full': Fixture('full', None, {}, {}),
+}
+
+
+def sha256(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def read_lines(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read().splitlines()
+
+
+def run_stage(stage, data):
+    '''
+    Runs stage on data (HTML files for extract, lines for the others) the way pipeline.py does.
+    Returns the output lines (for macrons, the lexicon) and the number of input lines.
+    '''
+    stats = StageStats(stage)
+    if stage == 'extract':
+        output = list(pipeline.extract(data, stats))
+    elif stage == 'reshuffle':
+        output = list(pipeline.map_stage(pipeline.reshuffle, data, stats))
+    elif stage == 'brackets':
+        output = list(pipeline.map_stage(pipeline.check_brackets, data, stats))
+    else:
+        f = StringIO()
+        write_lexicon(count_markings(pipeline.harvest(data, stats)), f)
+        output = f.getvalue().splitlines()
+    return output, stats.lines_in
+
+
+def measure(stage, data, memory=True):
+    '''
+    Runs stage twice from cold grc_utils caches: once timed, once traced for peak memory.
+    '''
+    clear_caches()
+    start = time.perf_counter()
+    output, lines = run_stage(stage, data)
+    seconds = time.perf_counter() - start
+
+    peak = None
+    if memory:
+        clear_caches()
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        run_stage(stage, data)
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+        tracemalloc.stop()
+
+    text = '\n'.join(output) + '\n' if output else ''
+    return {
+        'lines': lines,
+        'seconds': round(seconds, 3),
+        'lines_per_second': round(lines / seconds, 1) if seconds else 0.0,
+        'peak_bytes': peak,
+        'output_lines': len(output),
+        'sha256': sha256(text),
+    }, output
+
+
+def run_fixture(fixture, memory=True):
+    html_files = [HTML_DIR / name for name in fixture.html_files] if fixture.html_files else sorted(HTML_DIR.glob('*.html'))
+    results = {}
+    data = html_files
+    for stage in STAGES:
+        if stage in fixture.inputs:
+            data = read_lines(HERE / fixture.inputs[stage])
+        result, output = measure(stage, data, memory)
+        if stage in fixture.expected:
+            result['expected'] = output == read_lines(HERE / fixture.expected[stage])
+        results[stage] = result
+        tracer.info(f"{fixture.name:<7} {stage:<10} {result['lines']:>8} lines {result['seconds']:8.2f}s {result['lines_per_second']:>10.0f} lines/s"
+                    + (f" {result['peak_bytes'] / 2**20:8.1f} MiB peak" if result['peak_bytes'] is not None else ''))
+        data = output
+    return results
+
+
+def load_baseline():
+    if BASELINE_FILE.exists():
+        with open(BASELINE_FILE, encoding='utf-8') as f:
+            return json.load(f)
+    return {'grc_utils': None, 'fixtures': {}}
+
+
+def save_baseline(baseline):
+    with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=1, sort_keys=True, ensure_ascii=False)
+        f.write('\n')
+
+
+def check(name, results, baseline, threshold):
+    '''
+    Returns a list of failures of fixture name against the baseline.
+    '''
+    failures = []
+    recorded = baseline['fixtures'].get(name)
+    golden = baseline.get('grc_utils') == grc_utils_version()
+    if recorded is None:
+        tracer.info(f"No baseline for {name}, run with --update to record one")
+    elif not golden:
+        tracer.info(f"Baseline recorded with grc_utils {baseline.get('grc_utils')}, not {grc_utils_version()}: golden outputs not compared")
+
+    for stage, result in results.items():
+        if result.get('expected') is False:
+            failures.append(f"{name}/{stage}: output differs from {FIXTURES[name].expected[stage]}")
+        if recorded is None or stage not in recorded:
+            continue
+        before = recorded[stage]
+        if golden and result['sha256'] != before['sha256']:
+            failures.append(f"{name}/{stage}: output changed ({result['output_lines']} lines, {before['output_lines']} in the baseline)")
+        if before['seconds'] >= MIN_SECONDS and result['lines_per_second'] < before['lines_per_second'] * (1 - threshold):
+            failures.append(f"{name}/{stage}: {result['lines_per_second']:.0f} lines/s, down from {before['lines_per_second']:.0f}")
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark every stage, and check its output against the golden baseline.')
+    parser.add_argument('fixtures', nargs='*', help=f"fixtures to run, of {', '.join(FIXTURES)} (default: small medium)")
+    parser.add_argument('--update', action='store_true', help='record the outputs and throughput of this run as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='largest tolerated drop in lines per second, as a fraction (default: 0.25)')
+    parser.add_argument('--no-memory', action='store_true', help='skip the (untimed) peak memory runs')
+    parser.add_argument('--results', metavar='FILE', help='also write the results as JSON to FILE')
+    args = parser.parse_args()
+    tracer.set_level(tracing.INFO)
+    unknown = set(args.fixtures) - set(FIXTURES)
+    if unknown:
+        parser.error(f"unknown fixtures: {', '.join(sorted(unknown))}")
+
+    baseline = load_baseline()
+    all_results = {}
+    failures = []
+    for name in args.fixtures or ['small', 'medium']:
+        results = run_fixture(FIXTURES[name], memory=not args.no_memory)
+        all_results[name] = results
+        if args.update:
+            failures += [f"{name}/{stage}: output differs from {FIXTURES[name].expected[stage]}"
+                         for stage, result in results.items() if result.get('expected') is False]
+            baseline['fixtures'][name] = {stage: {k: v for k, v in result.items() if k != 'expected'} for stage, result in results.items()}
+        else:
+            failures += check(name, results, baseline, args.threshold)
+
+    if args.results:
+        with open(args.results, 'w', encoding='utf-8') as f:
+            json.dump(all_results, f, indent=1)
+
+    if args.update:
+        baseline['grc_utils'] = grc_utils_version()
+        baseline['python'] = platform.python_version()
+        save_baseline(baseline)
+        tracer.info(f"Baseline saved to {BASELINE_FILE.name}")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    tracer.info("OK")
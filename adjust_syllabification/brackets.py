@@ -0,0 +1,81 @@
+'''
+Line-local bracket checking of scanned lines.
+
+Every line is checked on its own, so an unclosed bracket never makes the following lines fail too.
+check_lines streams any number of lines through the check, optionally in a process pool.
+'''
+
+from collections import namedtuple
+import re
+
+from parallel import map_chunks
+
+# Dictionary to map closing brackets to their corresponding opening brackets
+BRACKETS = {')': '(', ']': '[', '}': '{'}
+# Valid opening brackets
+OPENING = set(['(', '[', '{'])
+
+# Lines whose brackets are all unnested pairs, i.e. almost all scanned lines, are fine without further ado
+flat_pattern = re.compile(r'[^()\[\]{}]*(?:(?:\([^()\[\]{}]*\)|\[[^()\[\]{}]*\]|\{[^()\[\]{}]*\})[^()\[\]{}]*)*')
+
+'''
+reason: 'unmatched_closing', 'mismatched' or 'unclosed'
+column: 1-based column of the offending bracket
+bracket: the offending bracket
+'''
+BracketError = namedtuple('BracketError', ['reason', 'column', 'bracket', 'message'])
+
+
+def find_bracket_errors(line):
+    '''
+    Returns a list of the BracketErrors in line, empty if all brackets are properly closed.
+    '''
+    if flat_pattern.fullmatch(line):
+        return []
+    stack = []
+    errors = []
+    for col, char in enumerate(line, 1):
+        if char in OPENING:
+            stack.append((char, col))
+        elif char in BRACKETS:
+            if not stack:
+                errors.append(BracketError('unmatched_closing', col, char, f"Unmatched closing bracket '{char}' at column {col}"))
+            elif stack[-1][0] != BRACKETS[char]:
+                errors.append(BracketError('mismatched', col, char, f"Mismatched bracket at column {col}: Expected closing for '{stack[-1][0]}' (opened at column {stack[-1][1]}) but found '{char}'"))
+                stack.pop()
+            else:
+                stack.pop()
+    for char, col in stack:
+        errors.append(BracketError('unclosed', col, char, f"Unclosed opening bracket '{char}' at column {col}"))
+    return errors
+
+
+def bracket_errors(line):
+    '''
+    Returns a list of the bracket errors in line as messages, empty if all brackets are properly closed.
+
+    >>> bracket_errors('[ὦ] [παῖ] {τέ}[λος')
+    ["Unclosed opening bracket '[' at column 15"]
+    '''
+    return [error.message for error in find_bracket_errors(line)]
+
+
+def check_chunk(lines):
+    '''
+    Process pool worker: the errors of every line of a chunk, in order.
+    '''
+    return [find_bracket_errors(line.rstrip('\n')) for line in lines]
+
+
+def check_lines(lines, jobs=1, chunk_size=10000):
+    '''
+    Yields (line, errors) for every line, in input order.
+    With jobs > 1, chunks of chunk_size lines are checked in a process pool (see parallel.py).
+    '''
+    if jobs <= 1:
+        for line in lines:
+            yield line, find_bracket_errors(line.rstrip('\n'))
+        return
+
+    for chunk, errors in map_chunks(check_chunk, lines, jobs, chunk_size):
+        yield from zip(chunk, errors)
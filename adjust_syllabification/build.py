@@ -0,0 +1,267 @@
+'''
+Incremental build of the whole corpus, one work (i.e. one HTML file) at a time.
+
+Every stage script is run on a single work in a scratch directory, and its output is kept as a
+per-work shard in .build_cache/. A shard is keyed by the content hash of its input (the HTML source
+or the previous stage's shard), the hash of the stage's code and, where the stage uses it, the
+grc_utils version. When the key is unchanged the cached shard is reused, so when e.g. only iliad7.html
+is updated, only the four iliad7 shards are rebuilt. The merged hypotactic_all_*.txt files are then
+concatenated from the shards, and only rewritten if one of their shards changed.
+
+Run from the repository root:
+
+python adjust_syllabification/build.py
+'''
+
+from collections import namedtuple
+from pathlib import Path
+import argparse
+import ast
+import hashlib
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from fingerprints import file_hash, grc_utils_version
+from macron_lexicon import merge_lexicons
+
+REPO = Path(__file__).resolve().parent.parent
+HTML_DIR = REPO / 'hypotactic_htmls_greek'
+OUTPUT_DIR = REPO / 'adjust_syllabification'
+CACHE_DIR = OUTPUT_DIR / '.build_cache'
+MANIFEST = CACHE_DIR / 'manifest.json'
+
+'''
+script: the stage's script, which with every module of the repository it imports (see stage_code)
+is what the stage output depends on
+grc_utils: whether the grc_utils version is part of the cache key
+'''
+Stage = namedtuple('Stage', ['name', 'script', 'grc_utils', 'merged'])
+
+STAGES = [
+    Stage('raw', 'adjust_syllabification/1_hypotactic_macrons.py', False, 'hypotactic_all_raw.txt'),
+    Stage('shuffled', 'adjust_syllabification/3_hypotactic_shuffle_sylls.py', True, 'hypotactic_all_shuffled.txt'),
+    Stage('cleaned', 'adjust_syllabification/2_check_parentheses.py', False, 'hypotactic_all_shuffled_cleaned.txt'),
+    Stage('macrons', 'extract_macrons_from_open_sylls.py', True, 'hypotactic_macrons.tsv'),
+]
+
+
+def imported_names(path):
+    '''
+    The modules imported anywhere in the file at path, inside functions too, as written.
+    '''
+    names = set()
+    for node in ast.walk(ast.parse(path.read_text(encoding='utf-8'))):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module)
+    return names
+
+
+def stage_code(stage):
+    '''
+    The files of the repository that the stage's script imports, directly or through other modules,
+    the script included, relative to the repository root. Modules are looked for next to the importing
+    file, in adjust_syllabification/ (which the scripts at the root put on sys.path) and from the root.
+    '''
+    found = set()
+    todo = [REPO / stage.script]
+    while todo:
+        path = todo.pop()
+        if path in found:
+            continue
+        found.add(path)
+        for name in imported_names(path):
+            for candidate in [path.parent / f'{name}.py', OUTPUT_DIR / f'{name}.py', REPO / (name.replace('.', '/') + '.py')]:
+                if candidate.exists():
+                    todo.append(candidate)
+                    break
+    return sorted(path.relative_to(REPO).as_posix() for path in found)
+
+
+def text_hash(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def stage_hash(stage):
+    parts = [stage.name] + [file_hash(REPO / path) for path in stage_code(stage)]
+    if stage.grc_utils:
+        parts.append(grc_utils_version())
+    return text_hash(*parts)
+
+
+def load_manifest():
+    if MANIFEST.exists():
+        with open(MANIFEST, encoding='utf-8') as f:
+            return json.load(f)
+    return {'sources': {}, 'shards': {}, 'merged': {}}
+
+
+def save_manifest(manifest):
+    tmp = MANIFEST.with_suffix('.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    tmp.replace(MANIFEST)
+
+
+# === Running a stage on one work ===
+
+def run_script(script, cwd, *args):
+    subprocess.run([sys.executable, str(REPO / script), *args], cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+
+
+def run_raw(html_file, scratch):
+    (scratch / 'hypotactic_htmls_greek').mkdir()
+    shutil.copy(html_file, scratch / 'hypotactic_htmls_greek' / html_file.name)
+    run_script('adjust_syllabification/1_hypotactic_macrons.py', scratch, '--streaming')
+    return scratch / 'hypotactic_all_raw.txt'
+
+
+def run_shuffled(raw_file, scratch):
+    shutil.copy(raw_file, scratch / 'hypotactic_all_raw.txt')
+    run_script('adjust_syllabification/3_hypotactic_shuffle_sylls.py', scratch)
+    return scratch / 'hypotactic_all_shuffled.txt'
+
+
+def run_cleaned(shuffled_file, scratch):
+    shutil.copy(shuffled_file, scratch / 'hypotactic_all_shuffled.txt')
+    run_script('adjust_syllabification/2_check_parentheses.py', scratch)
+    return scratch / 'hypotactic_all_shuffled_cleaned.txt'
+
+
+def run_macrons(cleaned_file, scratch):
+    (scratch / 'adjust_syllabification').mkdir()
+    shutil.copy(cleaned_file, scratch / 'adjust_syllabification' / 'hypotactic_all_shuffled_cleaned.txt')
+    run_script('extract_macrons_from_open_sylls.py', scratch)
+    return scratch / 'adjust_syllabification' / 'hypotactic_macrons.tsv'
+
+
+RUNNERS = {
+    'raw': run_raw,
+    'shuffled': run_shuffled,
+    'cleaned': run_cleaned,
+    'macrons': run_macrons,
+}
+
+
+# === Merging shards ===
+
+def merge_raw(shards, out):
+    # 1_hypotactic_macrons.py joins lines with '\n' without a trailing newline
+    first = True
+    for shard in shards:
+        text = shard.read_text(encoding='utf-8')
+        if not text:
+            continue
+        if not first:
+            out.write('\n')
+        out.write(text)
+        first = False
+
+
+def merge_lines(shards, out):
+    for shard in shards:
+        out.write(shard.read_text(encoding='utf-8'))
+
+
+def merge_macrons(shards, out):
+    # Every shard is a lexicon of its own; the counts of forms found in several works are added up
+    merge_lexicons(shards, out)
+
+
+MERGERS = {
+    'raw': merge_raw,
+    'shuffled': merge_lines,
+    'cleaned': merge_lines,
+    'macrons': merge_macrons,
+}
+
+
+def shard_path(stage, work):
+    suffix = '.tsv' if stage.name == 'macrons' else '.txt'
+    return CACHE_DIR / stage.name / (work + suffix)
+
+
+def build(works=None, force=False):
+    CACHE_DIR.mkdir(exist_ok=True)
+    manifest = load_manifest()
+    html_files = sorted(HTML_DIR.glob('*.html'))
+    if works:
+        missing = set(works) - {f.stem for f in html_files}
+        if missing:
+            raise SystemExit(f"Unknown works: {', '.join(sorted(missing))}")
+
+    # Sources that disappeared take their shards with them
+    current = {f.stem for f in html_files}
+    for stage_shards in manifest['shards'].values():
+        for work in set(stage_shards) - current:
+            del stage_shards[work]
+    manifest['sources'] = {work: h for work, h in manifest['sources'].items() if work in current}
+
+    stage_hashes = {stage.name: stage_hash(stage) for stage in STAGES}
+    rebuilt = 0
+    start = time.perf_counter()
+
+    for html_file in html_files:
+        work = html_file.stem
+        if works and work not in works:
+            continue
+        input_file = html_file
+        input_hash = file_hash(html_file)
+        manifest['sources'][work] = input_hash
+
+        for stage in STAGES:
+            stage_shards = manifest['shards'].setdefault(stage.name, {})
+            key = text_hash(stage_hashes[stage.name], input_hash)
+            shard = shard_path(stage, work)
+            entry = stage_shards.get(work)
+
+            if not force and entry and entry['key'] == key and shard.exists() and file_hash(shard) == entry['hash']:
+                input_file, input_hash = shard, entry['hash']
+                continue
+
+            stage_start = time.perf_counter()
+            with tempfile.TemporaryDirectory() as scratch:
+                output = RUNNERS[stage.name](input_file, Path(scratch))
+                shard.parent.mkdir(exist_ok=True)
+                shutil.copy(output, shard)
+            input_file, input_hash = shard, file_hash(shard)
+            stage_shards[work] = {'key': key, 'hash': input_hash}
+            save_manifest(manifest)
+            rebuilt += 1
+            print(f"Rebuilt {stage.name} shard for {work} in {time.perf_counter() - stage_start:.2f}s")
+
+    # Merged outputs, from all works in order, only if one of their shards changed
+    for stage in STAGES:
+        stage_shards = manifest['shards'].get(stage.name, {})
+        ordered = [f.stem for f in html_files if f.stem in stage_shards]
+        if len(ordered) < len(html_files):
+            print(f"Skipping {stage.merged}: not all works have been built yet")
+            continue
+        merged_key = text_hash(*(stage_shards[work]['hash'] for work in ordered))
+        merged = OUTPUT_DIR / stage.merged
+        if not force and manifest['merged'].get(stage.name) == merged_key and merged.exists():
+            continue
+        with open(merged, 'w', encoding='utf-8') as out:
+            MERGERS[stage.name]([shard_path(stage, work) for work in ordered], out)
+        manifest['merged'][stage.name] = merged_key
+        print(f"Merged {len(ordered)} shards into {merged.relative_to(REPO)}")
+
+    save_manifest(manifest)
+    print(f"Done in {time.perf_counter() - start:.2f}s: {rebuilt} shard(s) rebuilt.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Incrementally rebuild the adjusted corpus from the Hypotactic HTML files.')
+    parser.add_argument('works', nargs='*', help='only (re)build these works, e.g. iliad7')
+    parser.add_argument('--force', action='store_true', help='ignore the cache and rebuild everything')
+    args = parser.parse_args()
+    build(args.works, args.force)
@@ -0,0 +1,241 @@
+'''
+Compact in-memory model of scanned lines, so that the bracket notation is parsed only once.
+
+A Line holds a single text buffer, i.e. the line without its scansion brackets, plus parallel arrays:
+the start and end offset of every syllable in the buffer, the weight of every syllable as one bit
+of an int, and the start and end offset of every word. Syllables are cheap views into the line.
+
+>>> line = Line.parse('[ὦ] [παῖ] {τέ}[λος] [μὲν] [Ζεὺ]{ς ἔ}[χει]')
+>>> line.text
+'ὦ παῖ τέλος μὲν Ζεὺς ἔχει'
+>>> line.pattern()
+'--u---u-'
+>>> line[6].text, line[6].heavy, line.words()[line[6].word]
+('ς ἔ', False, 'ἔχει')
+>>> str(line)
+'[ὦ] [παῖ] {τέ}[λος] [μὲν] [Ζεὺ]{ς ἔ}[χει]'
+'''
+
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+import re
+
+from grc_utils import VOWELS
+
+syllable_pattern = re.compile(r'\[[^\]]+\]|\{[^\}]+\}')
+syllable_split_pattern = re.compile(r'(\[[^\]]+\]|\{[^\}]+\})')
+word_pattern = re.compile(r'\S+')
+
+
+class Syllable:
+    '''
+    View of the index-th syllable of a Line.
+    '''
+    __slots__ = ('line', 'index')
+
+    def __init__(self, line, index):
+        self.line = line
+        self.index = index
+
+    @property
+    def start(self):
+        return self.line.starts[self.index]
+
+    @property
+    def end(self):
+        return self.line.ends[self.index]
+
+    @property
+    def text(self):
+        '''
+        The syllable as scanned, including any word-dividing space, e.g. 'ς ἔ'.
+        '''
+        return self.line.text[self.start:self.end]
+
+    @property
+    def sequence(self):
+        '''
+        The syllable without whitespace, e.g. 'ςἔ'.
+        '''
+        return ''.join(self.text.split())
+
+    @property
+    def heavy(self):
+        return self.line.is_heavy(self.index)
+
+    @property
+    def nucleus(self):
+        '''
+        Offset of the first vowel of the syllable in the line, or None if it has none.
+        '''
+        text = self.line.text
+        for offset in range(self.start, self.end):
+            if text[offset] in VOWELS:
+                return offset
+        return None
+
+    @property
+    def word(self):
+        '''
+        Index of the word the syllable belongs to, i.e. the word of its first vowel, or None.
+        '''
+        nucleus = self.nucleus
+        return None if nucleus is None else self.line.word_of(nucleus)
+
+    def __repr__(self):
+        return f"Syllable({self.text!r}, {'heavy' if self.heavy else 'light'})"
+
+
+class Line:
+    __slots__ = ('text', 'starts', 'ends', 'weights', 'word_starts', 'word_ends')
+
+    def __init__(self, text, starts, ends, weights):
+        self.text = text
+        self.starts = starts
+        self.ends = ends
+        self.weights = weights  # bit i set if syllable i is heavy
+        spans = [match.span() for match in word_pattern.finditer(text)]
+        self.word_starts = array('I', [start for start, _ in spans])
+        self.word_ends = array('I', [end for _, end in spans])
+
+    @classmethod
+    def parse(cls, scanned):
+        '''
+        Parses a line in the [heavy]{light} notation. Anything outside the brackets, typically
+        spaces, is kept in the text buffer as well, so that str() gives back the same line.
+        '''
+        # Alternately the text between syllables and a syllable with its brackets
+        pieces = syllable_split_pattern.split(scanned.rstrip('\n'))
+        starts = array('I')
+        ends = array('I')
+        weights = 0
+        length = len(pieces[0])
+        for i in range(1, len(pieces), 2):
+            syllable = pieces[i]
+            if syllable[0] == '[':
+                weights |= 1 << (i >> 1)
+            pieces[i] = syllable = syllable[1:-1]
+            starts.append(length)
+            length += len(syllable)
+            ends.append(length)
+            length += len(pieces[i + 1])
+        return cls(''.join(pieces), starts, ends, weights)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError('syllable index out of range')
+        return Syllable(self, index % len(self))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield Syllable(self, index)
+
+    def is_heavy(self, index):
+        return bool(self.weights >> index & 1)
+
+    def pattern(self):
+        '''
+        The weights as a string of - (heavy) and u (light).
+        '''
+        return ''.join('-' if self.weights >> i & 1 else 'u' for i in range(len(self)))
+
+    def letters(self):
+        '''
+        The text of the syllables without their spaces, i.e. what the syllabifier sees, and the offset
+        in it where every syllable ends.
+
+        >>> Line.parse('[Ζεὺς] {ἔ}[χει]').letters()
+        ('Ζεὺςἔχει', [4, 5, 8])
+        '''
+        text = self.text
+        syllables = [text[start:end].replace(' ', '') for start, end in zip(self.starts, self.ends)]
+        return ''.join(syllables), list(accumulate(map(len, syllables)))
+
+    def with_boundaries(self, ends):
+        '''
+        The line with its syllables ending at ends instead, ends being offsets into letters().
+        Spaces at a boundary go between the syllables, spaces within a syllable stay in it, and the
+        weights stay as they are.
+
+        >>> str(Line.parse('[Ζεὺς] {ἔ}[χει]').with_boundaries([3, 5, 8]))
+        '[Ζεὺ]{ς ἔ}[χει]'
+        '''
+        text = self.text
+        # For every character of the text outside letters(), the offset in letters() it comes before
+        skipped = []
+        count = 0
+        previous_end = 0
+        for start, end in zip(self.starts, self.ends):
+            skipped.extend([count] * (start - previous_end))
+            if ' ' in text[start:end]:
+                for char in text[start:end]:
+                    if char == ' ':
+                        skipped.append(count)
+                    else:
+                        count += 1
+            else:
+                count += end - start
+            previous_end = end
+        starts = array('I', [0])
+        starts.extend(ends[:-1])
+        new_ends = array('I', [end - 1 for end in ends])
+        for i in range(len(starts)):
+            starts[i] += bisect_right(skipped, starts[i])
+            new_ends[i] += bisect_right(skipped, new_ends[i]) + 1
+        line = Line.__new__(Line)
+        line.text = text
+        line.starts = starts
+        line.ends = new_ends
+        line.weights = self.weights
+        # Same text, so the same words
+        line.word_starts = self.word_starts
+        line.word_ends = self.word_ends
+        return line
+
+    def words(self):
+        return [self.text[start:end] for start, end in zip(self.word_starts, self.word_ends)]
+
+    def word_of(self, offset):
+        '''
+        Index of the word containing offset, or None if it falls between words.
+        '''
+        index = bisect_right(self.word_starts, offset) - 1
+        if index < 0 or offset >= self.word_ends[index]:
+            return None
+        return index
+
+    def __str__(self):
+        text = self.text
+        weights = self.weights
+        pieces = []
+        previous_end = 0
+        for index, (start, end) in enumerate(zip(self.starts, self.ends)):
+            pieces.append(text[previous_end:start])
+            if weights >> index & 1:
+                pieces.append('[' + text[start:end] + ']')
+            else:
+                pieces.append('{' + text[start:end] + '}')
+            previous_end = end
+        pieces.append(text[previous_end:])
+        return ''.join(pieces)
+
+    def __repr__(self):
+        return f'Line({str(self)!r})'
+
+
+def load_corpus(path):
+    '''
+    Parses every line of a file in the [heavy]{light} notation, e.g. hypotactic_all_shuffled_cleaned.txt.
+    '''
+    with open(path, encoding='utf-8') as f:
+        return [Line.parse(line) for line in f]
+
+
+def save_corpus(lines, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        for line in lines:
+            f.write(str(line) + '\n')
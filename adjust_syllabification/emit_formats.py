@@ -0,0 +1,302 @@
+'''
+All views of the corpus from a single pass over the HTML:
+
+python adjust_syllabification/emit_formats.py                       # raw, txt and tsv, for all works
+python adjust_syllabification/emit_formats.py --format tsv hypotactic_htmls_greek/iliad1.html
+python adjust_syllabification/emit_formats.py --format raw --output-dir adjust_syllabification
+
+Every div.line is parsed once (see hypotactic_html.py), and handed to each of the chosen emitters,
+which write under the output directory (adjust_syllabification/emitted/ by default, so that the
+files in the repo are only replaced on purpose):
+
+raw   hypotactic_all_raw.txt, as made by 1_hypotactic_macrons.py, e.g.
+      [μοῦ]{σά} {μοι} [ἔν]{νε}{πε} [ἔρ]{γα} {πο}[λυ][χρύ][σου] {Ἀ}{φρο}[δί][της]
+txt   hypotactic_txts_greek/<work>.txt, the text and the weight pattern of every line, e.g.
+      [μοῦσά μοι ἔννεπε ἔργα πολυχρύσου Ἀφροδίτης,], [-u u -uu -u u--- uu--]
+tsv   tsv/<work>.tsv, text, pattern, metre and caesurae, e.g.
+      μοῦσά μοι ἔννεπε ἔργα πολυχρύσου Ἀφροδίτης,	-u u -uu -u u--- uu--	dactylic hexameter	feminine penthemimeral
+
+The metre in the tsv files is the line's data-metre, under its name in the tsv files (see
+DATA_METRES). Lines whose data-metre has no such name, or that have none (e.g. elegy, which may be
+either), fall back on a heuristic that recognises the metre from the weight pattern alone (see
+METRE_PATTERNS), and are labelled lyric if they fit none of the patterns. The caesurae of
+hexameters and Porson's bridge in tragic trimeters are found in the pattern, where it fits the metre.
+
+A new format is a subclass of Emitter added to EMITTERS: it gets every line of every work as a
+ScannedLine, with the bracket text, word texts and word patterns already worked out.
+'''
+
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from pathlib import Path
+import argparse
+import re
+import time
+
+from hypotactic_html import format_html_line, iter_html_lines
+
+REPO = Path(__file__).resolve().parent.parent
+HTML_DIR = REPO / 'hypotactic_htmls_greek'
+OUTPUT_DIR = REPO / 'adjust_syllabification' / 'emitted'
+
+'''
+A line as handed to the emitters: work is the stem of its HTML file, attrs the attributes of its div.line,
+formatted its bracket text (format_meter_line), and texts and patterns the text and '-'/'u' pattern of its words.
+'''
+ScannedLine = namedtuple('ScannedLine', ['work', 'attrs', 'formatted', 'texts', 'patterns'])
+
+METRE_PATTERNS = [
+    ('dactylic hexameter', re.compile(r'(?:-(?:uu|-)){5}-[-u]')),
+    ('dactylic pentameter', re.compile(r'-(?:uu|-)-(?:uu|-)--uu-uu-')),
+    # one group per element, for Porson's bridge; an anapaest may stand in for the first iamb
+    ('iambic trimeter (tragic)', re.compile(r'(uu|[-u])(-)(u)(-)([-u])(-)(u)(-)([-u])(-)(u)(-)')),
+    ('iambic trimeter (anapaestic)', re.compile(r'(?:u-|--|uu-){6}')),
+    # whole metra, at least a dimeter
+    ('anapaestic', re.compile(r'(?:(?:uu-|--|-uu){2}){2,}')),
+]
+LYRIC = 'lyric'
+
+# The tsv names of the data-metres that have one
+DATA_METRES = {
+    'hexameter': 'dactylic hexameter',
+    'pentameter': 'dactylic pentameter',
+    'ia6': 'iambic trimeter (tragic)',
+    'ia6g': 'iambic trimeter (tragic)',
+    'an2': 'anapaestic',
+    'an2cat': 'anapaestic',
+    'an3': 'anapaestic',
+    'an4': 'anapaestic',
+    'an4cat': 'anapaestic',
+    'an6': 'anapaestic',
+    'an6cat': 'anapaestic',
+}
+
+# Word ends after these syllables of a hexameter, as (foot, syllable in the foot), both counted from 1,
+# in the order they are listed in; a masculine penthemimeral rules out a feminine one
+HEXAMETER_CAESURAE = [
+    ((3, 1), 'masculine penthemimeral'),
+    ((3, 2), 'feminine penthemimeral'),
+    ((4, 1), 'hepthemimeral'),
+    ((2, 1), 'trithemimeral'),
+]
+NOT_PORSON = 'Not Porson'
+
+
+def scan_words(line):
+    '''
+    The text and the '-'/'u' pattern of every word of an HtmlLine with at least one scanned syllable.
+
+    Unlike in the bracket text, a syllable inside words nested by malformed markup only counts for the
+    innermost of them.
+    '''
+    owner = {}
+    for index, word in enumerate(line.words):
+        for syll in word:
+            owner[id(syll)] = index
+    texts = []
+    patterns = []
+    for index, word in enumerate(line.words):
+        text = ''
+        pattern = ''
+        for syll in word:
+            text_parts, classes = syll
+            if owner[id(syll)] != index:
+                continue
+            if 'long' in classes:
+                pattern += '-'
+            elif 'short' in classes:
+                pattern += 'u'
+            else:
+                continue
+            text += ''.join(text_parts)
+        if pattern:
+            texts.append(text)
+            patterns.append(pattern)
+    return texts, patterns
+
+
+def classify_metre(patterns, data_metre=None):
+    '''
+    (metre, caesurae) of a line from its data-metre, if that has a name in DATA_METRES, or else from
+    the patterns of its words; caesurae are only looked for if the patterns fit the metre.
+
+    >>> classify_metre(['-u', 'u', '-uu', '-u', 'u---', 'uu--'])
+    ('dactylic hexameter', ['feminine penthemimeral'])
+    >>> classify_metre(['-u', 'u-', 'uu', '-u', 'u-', 'uu-u', 'u--'])
+    ('dactylic hexameter', ['feminine penthemimeral', 'hepthemimeral', 'trithemimeral'])
+    >>> classify_metre(['u-', 'u-', 'u-', 'u', '--', '-u-'])
+    ('iambic trimeter (tragic)', ['Not Porson'])
+    >>> classify_metre(['--uu-'], 'an2'), classify_metre(['--uu-'])
+    (('anapaestic', []), ('lyric', []))
+    '''
+    pattern = ''.join(patterns)
+    metre = DATA_METRES.get(data_metre)
+    if metre is not None:
+        match = dict(METRE_PATTERNS)[metre].fullmatch(pattern)
+        if not match:
+            return metre, []
+    else:
+        for metre, regex in METRE_PATTERNS:
+            match = regex.fullmatch(pattern)
+            if match:
+                break
+        else:
+            return LYRIC, []
+    word_ends = set()
+    end = 0
+    for word in patterns[:-1]:
+        end += len(word)
+        word_ends.add(end)
+    if metre == 'dactylic hexameter':
+        feet = re.findall('-(?:uu|-|u)', pattern)
+        starts = [sum(len(foot) for foot in feet[:i]) for i in range(len(feet))]
+        caesurae = []
+        for (foot, syllable), name in HEXAMETER_CAESURAE:
+            if syllable < len(feet[foot - 1]) and starts[foot - 1] + syllable in word_ends:
+                if name == 'feminine penthemimeral' and 'masculine penthemimeral' in caesurae:
+                    continue
+                caesurae.append(name)
+        return metre, caesurae
+    # Porson's bridge: no word end after a long third anceps, unless that word is a monosyllable
+    if metre == 'iambic trimeter (tragic)' and match.group(9) == '-' and match.end(9) in word_ends and match.start(9) not in word_ends:
+        return metre, [NOT_PORSON]
+    return metre, []
+
+
+class Emitter(ABC):
+    '''
+    One output format. begin_work and end_work bracket the lines of each work, in the order they are parsed.
+    '''
+
+    def begin_work(self, work):
+        pass
+
+    @abstractmethod
+    def emit(self, line):
+        pass
+
+    def end_work(self, work):
+        pass
+
+    def close(self):
+        pass
+
+
+class RawEmitter(Emitter):
+    '''
+    The bracket text of every non-empty line, one file for all works, as 1_hypotactic_macrons.py writes it.
+    '''
+
+    def __init__(self, output_dir=OUTPUT_DIR):
+        self.path = Path(output_dir) / 'hypotactic_all_raw.txt'
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.f = open(self.path, 'w', encoding='utf-8')
+        self.lines = 0
+
+    def emit(self, line):
+        if not line.formatted.strip():
+            return
+        # Separator before every line but the first, i.e. the same as '\n'.join(...)
+        if self.lines:
+            self.f.write('\n')
+        self.f.write(line.formatted)
+        self.lines += 1
+
+    def close(self):
+        self.f.close()
+
+
+class WorkEmitter(Emitter):
+    '''
+    One file per work in the subdirectory of the output directory, named <work><suffix>, with a row for
+    every line with scanned syllables, except for lacunae, i.e. lines without a letter, like [...].
+    '''
+
+    subdirectory = None
+    suffix = None
+
+    def __init__(self, output_dir=OUTPUT_DIR):
+        self.directory = Path(output_dir) / self.subdirectory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.f = None
+        self.lines = 0
+
+    def begin_work(self, work):
+        self.f = open(self.directory / (work + self.suffix), 'w', encoding='utf-8')
+
+    def emit(self, line):
+        if any(char.isalpha() for text in line.texts for char in text):
+            self.f.write(self.format(line) + '\n')
+            self.lines += 1
+
+    @abstractmethod
+    def format(self, line):
+        pass
+
+    def end_work(self, work):
+        self.f.close()
+        self.f = None
+
+
+class TxtEmitter(WorkEmitter):
+    subdirectory = 'hypotactic_txts_greek'
+    suffix = '.txt'
+
+    def format(self, line):
+        return f"[{' '.join(line.texts)}], [{' '.join(line.patterns)}]"
+
+
+class TsvEmitter(WorkEmitter):
+    subdirectory = 'tsv'
+    suffix = '.tsv'
+
+    def format(self, line):
+        metre, caesurae = classify_metre(line.patterns, line.attrs.get('data-metre'))
+        return '\t'.join([' '.join(line.texts), ' '.join(line.patterns), metre, ', '.join(caesurae)])
+
+
+EMITTERS = {
+    'raw': RawEmitter,
+    'txt': TxtEmitter,
+    'tsv': TsvEmitter,
+}
+
+
+def emit_corpus(html_files, emitters):
+    '''
+    Parses every line of html_files once, and hands it to all emitters. Returns the number of lines parsed.
+    '''
+    count = 0
+    for html_file in html_files:
+        work = Path(html_file).stem
+        for emitter in emitters:
+            emitter.begin_work(work)
+        for html_line in iter_html_lines(html_file):
+            texts, patterns = scan_words(html_line)
+            line = ScannedLine(work, html_line.attrs, format_html_line(html_line), texts, patterns)
+            for emitter in emitters:
+                emitter.emit(line)
+            count += 1
+        for emitter in emitters:
+            emitter.end_work(work)
+    for emitter in emitters:
+        emitter.close()
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write the raw, txt and tsv views of the corpus from one parse of the HTML.')
+    parser.add_argument('html_files', nargs='*', type=Path, help=f'HTML files to read (default: all of {HTML_DIR.name}/)')
+    parser.add_argument('--format', action='append', choices=sorted(EMITTERS), help='only this format (may be repeated; default: all)')
+    parser.add_argument('--output-dir', type=Path, default=OUTPUT_DIR,
+                        help=f'directory to write the formats to, each under its name in the repo (default: {OUTPUT_DIR.relative_to(REPO)}; . replaces the tsv and txt files of the repo)')
+    args = parser.parse_args()
+
+    html_files = args.html_files or sorted(HTML_DIR.glob('*.html'))
+    emitters = [EMITTERS[name](args.output_dir) for name in args.format or EMITTERS]
+
+    start = time.perf_counter()
+    count = emit_corpus(html_files, emitters)
+    print(f"✅ Done. {count} lines from {len(html_files)} files in {time.perf_counter() - start:.2f}s")
+    for name, emitter in zip(args.format or EMITTERS, emitters):
+        print(f"{name}: {emitter.lines} lines")
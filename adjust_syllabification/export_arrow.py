@@ -0,0 +1,197 @@
+'''
+Export of the adjusted corpus as Parquet or Arrow, so that it can be read without parsing the
+bracket notation, e.g. once per epoch:
+
+python adjust_syllabification/export_arrow.py hypotactic.parquet
+python adjust_syllabification/export_arrow.py hypotactic.arrow       # Arrow IPC, for memory-mapping
+
+Every line of every HTML file is run through the same stages as in pipeline.py (reshuffle, bracket
+check), and becomes one row:
+
+work        name of the HTML file, e.g. iliad1 (dictionary-encoded in Parquet, like metre)
+number      the line's data-number, e.g. 611 or 909b
+metre       the line's data-metre, e.g. hexameter or ia6g
+text        the line without brackets
+scanned     the line in the [heavy]{light} notation, as in hypotactic_all_shuffled_cleaned.txt
+syllables   list of {text, heavy, word}: the syllable as scanned, its weight and the index of its
+            word in the text split on whitespace (null if the syllable has no vowel)
+
+Rows are buffered into row groups (record batches for Arrow) of --row-group-size lines, each
+written as soon as it is full; --verify reads the file back and checks it has every row. To read, e.g.
+
+import pyarrow as pa, pyarrow.parquet as pq
+table = pq.read_table('hypotactic.parquet', columns=['metre', 'syllables'])
+table = pa.ipc.open_file(pa.memory_map('hypotactic.arrow')).read_all()   # no copy
+'''
+
+from pathlib import Path
+import argparse
+import hashlib
+import sys
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import grc_cache
+import pipeline
+import tracing
+from corpus import Line
+from grc_cache import load_caches, save_caches
+from hypotactic_html import iter_formatted_lines
+from tracing import tracer
+
+HTML_DIR = pipeline.HTML_DIR
+
+SYLLABLE = pa.struct([
+    ('text', pa.string()),
+    ('heavy', pa.bool_()),
+    ('word', pa.int16()),
+])
+
+SCHEMA = pa.schema([
+    ('work', pa.dictionary(pa.int16(), pa.string())),
+    ('number', pa.string()),
+    ('metre', pa.dictionary(pa.int16(), pa.string())),
+    ('text', pa.string()),
+    ('scanned', pa.string()),
+    ('syllables', pa.list_(SYLLABLE)),
+])
+
+# The Arrow IPC file format allows only one dictionary per column for the whole file, while every
+# record batch brings its own; work and metre are therefore plain strings there
+IPC_SCHEMA = pa.schema([field.with_type(pa.string()) if pa.types.is_dictionary(field.type) else field for field in SCHEMA])
+IPC_SUFFIXES = ('.arrow', '.feather', '.ipc')
+
+
+def iter_rows(html_files):
+    '''
+    Yields (work, number, metre, Line) for every line that makes it through the reshuffle and bracket check.
+    '''
+    for html_file in html_files:
+        work = Path(html_file).stem
+        for attrs, part in iter_formatted_lines(html_file):
+            shuffled = pipeline.reshuffle(part)
+            if not shuffled or pipeline.check_brackets(shuffled) is None:
+                continue
+            yield work, attrs.get('data-number'), attrs.get('data-metre'), Line.parse(shuffled)
+
+
+class BatchWriter:
+    '''
+    Collects rows column by column and writes them out row group by row group.
+    The file is written under a temporary name, and only renamed to path once it is complete.
+    '''
+
+    def __init__(self, path, row_group_size):
+        self.path = Path(path)
+        self.tmp = self.path.with_name(self.path.name + '.tmp')
+        self.row_group_size = row_group_size
+        if self.path.suffix in IPC_SUFFIXES:
+            self.schema = IPC_SCHEMA
+            self.writer = pa.ipc.new_file(str(self.tmp), self.schema)
+        else:
+            self.schema = SCHEMA
+            self.writer = pq.ParquetWriter(str(self.tmp), self.schema)
+        self.digest = hashlib.sha256()
+        self.rows = 0
+        self.row_groups = 0
+        self.reset()
+
+    def reset(self):
+        self.columns = {name: [] for name in SCHEMA.names}
+
+    def add(self, work, number, metre, line):
+        columns = self.columns
+        columns['work'].append(work)
+        columns['number'].append(number)
+        columns['metre'].append(metre)
+        columns['text'].append(line.text)
+        columns['scanned'].append(str(line))
+        columns['syllables'].append([
+            {'text': syllable.text, 'heavy': syllable.heavy, 'word': syllable.word} for syllable in line
+        ])
+        update_digest(self.digest, work, number, metre, columns['scanned'][-1])
+        if len(columns['work']) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self.columns['work']:
+            return
+        batch = pa.RecordBatch.from_pydict(self.columns, schema=self.schema)
+        if isinstance(self.writer, pq.ParquetWriter):
+            self.writer.write_batch(batch, row_group_size=self.row_group_size)
+        else:
+            self.writer.write_batch(batch)
+        self.rows += batch.num_rows
+        self.row_groups += 1
+        tracer.info(f"Wrote row group {self.row_groups} ({self.rows} lines so far)")
+        self.reset()
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        self.tmp.replace(self.path)
+
+    def abort(self):
+        self.writer.close()
+        self.tmp.unlink(missing_ok=True)
+
+
+def update_digest(digest, work, number, metre, scanned):
+    for value in (work, number, metre, scanned):
+        digest.update(('' if value is None else value).encode('utf-8') + b'\0')
+
+
+def read_digest(path):
+    '''
+    The digest of the rows of an exported file as read back, memory-mapped for Arrow IPC,
+    to compare with BatchWriter.digest.
+    '''
+    path = Path(path)
+    if path.suffix in IPC_SUFFIXES:
+        table = pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+    else:
+        table = pq.read_table(str(path))
+    digest = hashlib.sha256()
+    columns = [table.column(name).to_pylist() for name in ('work', 'number', 'metre', 'scanned')]
+    for row in zip(*columns):
+        update_digest(digest, *row)
+    return digest, table.num_rows
+
+
+def export(html_files, path, row_group_size=10000):
+    writer = BatchWriter(path, row_group_size)
+    try:
+        for row in iter_rows(html_files):
+            writer.add(*row)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return writer
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the adjusted corpus as Parquet (or Arrow IPC, for a .arrow file).')
+    parser.add_argument('output', type=Path, help='e.g. hypotactic.parquet or hypotactic.arrow')
+    parser.add_argument('html_files', nargs='*', type=Path, help=f'HTML files to export (default: all of {HTML_DIR.name}/)')
+    parser.add_argument('--row-group-size', type=int, default=10000, help='lines per row group (default: 10000)')
+    parser.add_argument('--verify', action='store_true', help='read the file back, and check that it has the rows that were written')
+    grc_cache.add_arguments(parser)
+    tracing.add_arguments(parser)
+    args = parser.parse_args()
+    tracing.configure(args)
+
+    if args.persist_cache:
+        load_caches()
+    writer = export(args.html_files or sorted(HTML_DIR.glob('*.html')), args.output, args.row_group_size)
+    tracer.info(f"Done! {writer.rows} lines in {writer.row_groups} row groups written to {args.output}")
+    if args.verify:
+        digest, rows = read_digest(args.output)
+        if rows != writer.rows or digest.digest() != writer.digest.digest():
+            tracer.info(f"Verification failed: {rows} lines read back from {args.output}")
+            sys.exit(1)
+        tracer.info(f"Verified {rows} lines")
+    if args.persist_cache:
+        save_caches()
+    tracing.finish(args)
@@ -0,0 +1,24 @@
+'''
+What the caches are keyed by: the content hash of a file, and the installed grc_utils version.
+
+Only the standard library is imported here, so that the build, the grc_utils caches and the scripts
+at the repository root (as adjust_syllabification.fingerprints) can all share it.
+'''
+
+from importlib import metadata
+import hashlib
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def grc_utils_version():
+    try:
+        return metadata.version('grc_utils')
+    except metadata.PackageNotFoundError:
+        return 'not installed'
@@ -0,0 +1,204 @@
+'''
+Memoized versions of the grc_utils functions that the scripts call for every token.
+
+Homeric formulae repeat constantly, so most syllabifier/normalize_word calls have already been
+made for the same string. Import the functions from here instead of from grc_utils:
+
+from grc_cache import normalize_word, syllabifier
+
+Whole lines, on the other hand, hardly ever repeat: syllabify_line syllabifies them uncached.
+
+When profiling (see tracing.py), the time spent in the underlying grc_utils calls is measured here.
+
+Every function gets its own bounded LRU cache with hit/miss/eviction counts (see cache_stats()).
+The caches can be saved to and loaded from disk, so that repeated runs start warm; a saved file
+is ignored if it was written with another grc_utils version.
+'''
+
+from collections import OrderedDict
+from pathlib import Path
+import pickle
+
+import grc_utils
+
+from fingerprints import grc_utils_version
+from tracing import tracer
+
+CACHE_FILE = Path(__file__).resolve().parent / '.grc_cache.pickle'
+DEFAULT_MAXSIZE = 200_000
+
+
+class BoundedCache:
+    '''
+    Least recently used cache of at most maxsize entries.
+    '''
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, persist=True):
+        self.maxsize = maxsize
+        self.persist = persist  # saved by save_caches()
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.added = None  # new entries since the last take_updates(), in worker processes
+
+    def get(self, key, compute):
+        try:
+            value = self.data[key]
+        except KeyError:
+            self.misses += 1
+            value = compute()
+            self.data[key] = value
+            if self.added is not None:
+                self.added.append((key, value))
+            if len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+            return value
+        self.hits += 1
+        self.data.move_to_end(key)
+        return value
+
+    def stats(self):
+        return {'size': len(self.data), 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+caches = {}
+
+
+def register(name, maxsize=DEFAULT_MAXSIZE, persist=True):
+    '''
+    A new BoundedCache, listed in cache_stats(), emptied by clear_caches() and merged from workers
+    like the grc_utils ones. Caches of values that do not only depend on grc_utils should not persist.
+    '''
+    cache = caches[name] = BoundedCache(maxsize, persist)
+    return cache
+
+
+def memoize(fn, maxsize=DEFAULT_MAXSIZE, copy=None):
+    '''
+    Wraps fn, whose arguments must be hashable, in a BoundedCache.
+    copy is applied to the cached value before returning it, for functions returning mutable values.
+    '''
+    cache = register(fn.__name__, maxsize)
+
+    def wrapper(*args):
+        value = cache.get(args, lambda: tracer.grc_utils(fn, *args))
+        return copy(value) if copy is not None and value is not None else value
+
+    wrapper.__name__ = fn.__name__
+    wrapper.__doc__ = fn.__doc__
+    wrapper.cache = cache
+    return wrapper
+
+
+def profiled(fn):
+    '''
+    For grc_utils functions that are not worth caching, but should be profiled.
+    '''
+    def wrapper(*args):
+        return tracer.grc_utils(fn, *args)
+
+    wrapper.__name__ = fn.__name__
+    wrapper.__doc__ = fn.__doc__
+    return wrapper
+
+
+syllabifier = memoize(grc_utils.syllabifier, copy=list)
+# Whole lines hardly ever repeat, so caching them would only hold on to memory and push the words out
+syllabify_line = profiled(grc_utils.syllabifier)
+normalize_word = memoize(grc_utils.normalize_word)
+count_dichrona_in_open_syllables = memoize(grc_utils.count_dichrona_in_open_syllables)
+word_with_real_dichrona = memoize(grc_utils.word_with_real_dichrona)
+is_open_syllable_in_word_in_synapheia = profiled(grc_utils.is_open_syllable_in_word_in_synapheia)
+
+
+def cache_stats():
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+def print_cache_stats():
+    for name, stats in cache_stats().items():
+        lookups = stats['hits'] + stats['misses']
+        if not lookups:
+            continue
+        hit_rate = stats['hits'] / lookups
+        print(f"{name}: {stats['hits']} hits, {stats['misses']} misses ({hit_rate:.1%} hit rate), {stats['evictions']} evictions, {stats['size']} cached")
+
+
+def clear_caches():
+    '''
+    Empties the caches and resets their counts, e.g. so that benchmarks start cold.
+    '''
+    for cache in caches.values():
+        cache.data.clear()
+        cache.hits = cache.misses = cache.evictions = 0
+
+
+def track_updates():
+    '''
+    Process pool initializer: from now on, the caches keep their new entries until take_updates().
+    '''
+    for cache in caches.values():
+        cache.added = []
+
+
+def take_updates():
+    '''
+    In a worker, the new entries and counts of every cache since the last call, to be merged into
+    the parent's caches with merge_updates(); otherwise these would be lost with the worker.
+    '''
+    updates = {}
+    for name, cache in caches.items():
+        updates[name] = (cache.stats(), cache.added or [])
+        cache.hits = cache.misses = cache.evictions = 0
+        cache.added = []
+    return updates
+
+
+def merge_updates(updates):
+    for name, (stats, items) in updates.items():
+        cache = caches[name]
+        cache.hits += stats['hits']
+        cache.misses += stats['misses']
+        cache.evictions += stats['evictions']
+        for key, value in items:
+            cache.data[key] = value
+            cache.data.move_to_end(key)
+        while len(cache.data) > cache.maxsize:
+            cache.data.popitem(last=False)
+
+
+def add_arguments(parser):
+    parser.add_argument('--persist-cache', action='store_true', help='load the grc_utils caches from disk before, and save them after the run')
+
+
+def load_caches(path=CACHE_FILE):
+    '''
+    Warms the caches from path, if it exists and was written with the installed grc_utils version.
+    '''
+    path = Path(path)
+    if not path.exists():
+        return False
+    with open(path, 'rb') as f:
+        saved = pickle.load(f)
+    if saved.get('grc_utils') != grc_utils_version():
+        return False
+    for name, items in saved['caches'].items():
+        if name in caches and caches[name].persist:
+            cache = caches[name]
+            for key, value in items[-cache.maxsize:]:
+                cache.data[key] = value
+    return True
+
+
+def save_caches(path=CACHE_FILE):
+    path = Path(path)
+    saved = {
+        'grc_utils': grc_utils_version(),
+        'caches': {name: list(cache.data.items()) for name, cache in caches.items() if cache.persist},
+    }
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'wb') as f:
+        pickle.dump(saved, f, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp.replace(path)
@@ -0,0 +1,181 @@
+'''
+Streaming extraction of scanned lines from the Hypotactic HTML files.
+
+Instead of building a full BeautifulSoup tree and running CSS selectors over it,
+the files are fed through the standard library's event-driven HTMLParser, and every
+div.line is emitted as soon as its closing tag is seen. The formatted output is
+byte-identical to format_meter_line in 1_hypotactic_macrons.py, e.g.
+
+<div class="line hexameter" data-metre="hexameter" data-number="1"><span class="word"><span class="syll long lbn">μῆ</span><span class="syll short">νιν</span></span>...
+
+becomes
+
+[μῆ]{νιν} {ἄ}[ει]{δε} {θε}[ὰ] [Πη][λη]{ϊ}{ά}[δεω] {Ἀ}{χι}[λῆ][ος]
+'''
+
+import time
+from collections import deque, namedtuple
+from html.parser import HTMLParser
+
+# Elements that never get a closing tag, and thus must never be pushed on the stack
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+'''
+A parsed div.line: attrs holds the attributes of the div (e.g. data-metre, data-number),
+and words is a list of words, each a list of (text parts, classes) tuples, one per span.syll.
+'''
+HtmlLine = namedtuple('HtmlLine', ['attrs', 'words'])
+
+
+class LineParser(HTMLParser):
+    '''
+    Event parser collecting div.line > span.word > span.syll.
+    Completed lines are appended to self.lines; drain it between feed() calls to stream.
+
+    A few files have malformed markup with spans nested inside each other, e.g. in odyssey2.html
+
+    <span class="syll long lbn" data-mac="δᾱς"><span class="syll short">δας</span></span>
+
+    To stay byte-identical with the CSS selectors in format_meter_line, every element collects
+    all its matching descendants, just like select('span.word') and select('span.syll') do.
+    '''
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines = []
+        self.pending = deque()  # open or not yet emitted lines, in document order
+        self.stack = []  # (tag, role, record) for every open element
+        self.open_lines = []
+        self.open_words = []
+        self.open_sylls = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_ELEMENTS:
+            return
+        classes = ()
+        for name, value in attrs:
+            if name == 'class' and value:
+                classes = value.split()
+        role = None
+        record = None
+        if tag == 'div' and 'line' in classes:
+            role = 'line'
+            record = HtmlLine(dict(attrs), [])
+            self.pending.append([record, False])
+            self.open_lines.append(record)
+        elif tag == 'span' and 'word' in classes:
+            role = 'word'
+            record = []
+            for line in self.open_lines:
+                line.words.append(record)
+            self.open_words.append(record)
+        elif tag == 'span' and 'syll' in classes:
+            role = 'syll'
+            record = ([], classes)
+            for word in self.open_words:
+                word.append(record)
+            self.open_sylls.append(record)
+        self.stack.append((tag, role, record))
+
+    def handle_endtag(self, tag):
+        # Pop up to and including the matching element, closing anything left open inside it
+        for depth in range(len(self.stack) - 1, -1, -1):
+            if self.stack[depth][0] == tag:
+                break
+        else:
+            return
+        while len(self.stack) > depth:
+            _, role, record = self.stack.pop()
+            if role == 'syll':
+                self.open_sylls.pop()
+            elif role == 'word':
+                self.open_words.pop()
+            elif role == 'line':
+                self.open_lines.pop()
+                for entry in self.pending:
+                    if entry[0] is record:
+                        entry[1] = True
+                        break
+                while self.pending and self.pending[0][1]:
+                    self.lines.append(self.pending.popleft()[0])
+
+    def handle_data(self, data):
+        for text, _ in self.open_sylls:
+            text.append(data)
+
+
+def iter_html_lines(html_file, chunk_size=1 << 16):
+    '''
+    Yields an HtmlLine for every div.line in html_file, reading it in chunks.
+    '''
+    parser = LineParser()
+    with open(html_file, encoding='utf-8') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            parser.feed(chunk)
+            yield from parser.lines
+            parser.lines.clear()
+    parser.close()
+    yield from parser.lines
+
+
+def format_html_line(line):
+    '''
+    Same output as format_meter_line, but for an HtmlLine.
+    '''
+    formatted_line = []
+    for word in line.words:
+        formatted_word = ''
+        for text_parts, classes in word:
+            text = ''.join(text_parts)
+            if 'long' in classes:
+                formatted_word += f'[{text}]'
+            elif 'short' in classes:
+                formatted_word += f'{{{text}}}'
+        if formatted_word:
+            formatted_line.append(formatted_word)
+    return ' '.join(formatted_line)
+
+
+def formatted_parts(line):
+    '''
+    The formatted HtmlLine as it appears in hypotactic_all_raw.txt: no lines if it is empty, and
+    several if one of its syllables contains a line break, as a few do.
+    '''
+    formatted = format_html_line(line)
+    if not formatted.strip():
+        return []
+    return formatted.split('\n')
+
+
+def iter_formatted_lines(html_file):
+    '''
+    Yields (attrs, formatted) for every line of html_file as it appears in hypotactic_all_raw.txt,
+    attrs being the attributes of its div.line (see formatted_parts).
+    '''
+    for line in iter_html_lines(html_file):
+        for part in formatted_parts(line):
+            yield line.attrs, part
+
+
+def extract_formatted_lines(html_file):
+    '''
+    All non-empty formatted lines of html_file, in document order.
+    '''
+    lines = []
+    for line in iter_html_lines(html_file):
+        formatted = format_html_line(line)
+        if formatted.strip():
+            lines.append(formatted)
+    return lines
+
+
+def timed_extract_formatted_lines(html_file):
+    '''
+    Process pool worker: returns (file name, formatted lines, seconds spent).
+    '''
+    start = time.perf_counter()
+    lines = extract_formatted_lines(html_file)
+    return html_file.name, lines, time.perf_counter() - start
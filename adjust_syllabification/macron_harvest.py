@@ -0,0 +1,169 @@
+'''
+Harvesting vowel length from human scanned verse: a dichronon (α, ι, υ) in an open syllable
+that is scanned heavy must be long, and one that is scanned light must be short, e.g.
+
+{ἀ}{δι}[νῶν] gives ἀ^δι^νῶν
+
+The input is the reshuffled and bracket checked corpus, i.e. hypotactic_all_shuffled_cleaned.txt.
+'''
+
+from grc_utils import DICHRONA, macrons_map, VOWELS
+from grc_cache import count_dichrona_in_open_syllables, is_open_syllable_in_word_in_synapheia, normalize_word, syllabifier, word_with_real_dichrona
+from corpus import Line
+from tracing import tracer
+from collections import defaultdict
+
+def syllable_spans(w, syllabification):
+    '''
+    The (start, end) indices in w of every syllable of its syllabification, end inclusive,
+    or None for a syllable that could not be found.
+    '''
+    normalized_w = normalize_word(w)
+    spans = []
+    cursor = 0
+    for syl in syllabification:
+        normalized_syl = normalize_word(syl)
+        syl_start = normalized_w.find(normalized_syl, cursor)
+        if syl_start == -1:
+            spans.append(None)
+            continue
+        spans.append((syl_start, syl_start + len(syl) - 1))
+        cursor = syl_start + len(normalized_syl)
+    return spans
+
+def harvest_line(line, line_num=0):
+    '''
+    Returns the words of one scanned line that got macrons (_) or breves (^) inserted.
+    '''
+    # Marked words of this line
+    output_list = []
+
+    line = line.strip()
+    if not line:
+        return output_list
+    
+    # Parse the line once: text buffer, syllable offsets and weights, word offsets
+    parsed = Line.parse(line)
+    words = parsed.words()
+    if tracer.debug:
+        tracer.log(f"Line {line_num}: Words: {words}")
+    
+    # Group syllables by the word of their first vowel, with their indices within that word
+    syllables_by_word = defaultdict(list)
+    for syllable in parsed:
+        word_idx = syllable.word
+        if word_idx is None:
+            if tracer.debug:
+                tracer.log(f"Line {line_num}: Warning: No vowel in syllable '{syllable.text}'")
+            continue
+        a = parsed.word_starts[word_idx]
+        b = parsed.word_ends[word_idx] - 1
+        start_idx = max(syllable.start, a) - a
+        end_idx = min(syllable.end - 1, b) - a
+        syllables_by_word[word_idx].append((syllable, start_idx, end_idx))
+        if tracer.debug:
+            tracer.log(f"Line {line_num}: Assigned syllable '{syllable.text}' to word '{words[word_idx]}' (indices: {start_idx}-{end_idx})")
+    if tracer.debug:
+        tracer.log(f"Line {line_num}: Syllables by word: {dict(syllables_by_word)}")
+    
+    # Process each word
+    for i, w in enumerate(words):
+        # Get next word (empty string if last word)
+        next_word = words[i+1] if i < len(words)-1 else ''
+        if tracer.debug:
+            tracer.log(f"Line {line_num}: Processing word '{w}' with next_word '{next_word}'")
+        
+        # Get syllabification
+        syllabification = syllabifier(w)
+        if tracer.debug:
+            tracer.log(f"Line {line_num}: Syllabifier output for '{w}': {syllabification}")
+        
+        # Debug dichrona count
+        dichrona_count = count_dichrona_in_open_syllables(w)
+        if tracer.debug:
+            dichrona_details = [(syl, [c for c in syl if c in DICHRONA], is_open_syllable_in_word_in_synapheia(syl, syllabification, next_word)) 
+                               for syl in syllabification]
+            tracer.log(f"Line {line_num}: Dichrona details for '{w}': {dichrona_details}")
+        
+        # Handle empty syllabification
+        if not syllabification:
+            if tracer.debug:
+                tracer.log(f"Line {line_num}: Warning: Empty syllabification for '{w}', assuming no open syllables or dichrona")
+            has_open_syll = False
+            dichrona_count = 0
+        else:
+            # Check if any syllable is open
+            has_open_syll = any(is_open_syllable_in_word_in_synapheia(syl, syllabification, next_word) for syl in syllabification)
+            if has_open_syll is None:
+                if tracer.debug:
+                    tracer.log(f"Line {line_num}: Warning: is_open_syllable_in_word_in_synapheia returned None for some syllables in '{w}', assuming False")
+                has_open_syll = False
+        
+        if tracer.debug:
+            tracer.log(f"Line {line_num}: Checking word '{w}': dichrona_count={dichrona_count}, has_open_syll={has_open_syll}")
+        
+        if dichrona_count > 0 and has_open_syll:
+            if tracer.debug:
+                tracer.log(f"Line {line_num}: Word '{w}' passed checks")
+            sylls = syllables_by_word.get(i, [])
+            if not sylls:
+                if tracer.debug:
+                    tracer.log(f"Line {line_num}: No syllables assigned to '{w}'")
+                continue
+            if tracer.debug:
+                tracer.log(f"Line {line_num}: Syllables for '{w}': {[syllable.sequence for syllable, _, _ in sylls]}")
+            insertion_dict = {}
+            
+            spans = syllable_spans(w, syllabification)
+            if tracer.debug:
+                tracer.log(f"Line {line_num}: Syllable spans in '{w}': {list(zip(syllabification, spans))}")
+            span_idx = 0
+            for syllable, start_idx, end_idx in sylls:
+                # Both the bracketed syllables and the syllabifier's are in word order
+                while span_idx < len(spans) and (spans[span_idx] is None or spans[span_idx][1] < start_idx):
+                    span_idx += 1
+                if span_idx == len(spans) or spans[span_idx][0] > start_idx:
+                    if tracer.debug:
+                        tracer.log(f"Line {line_num}: Warning: No matching syllable for '{syllable.sequence}' in '{w}'")
+                    continue
+                corresponding_syl = syllabification[span_idx]
+                if tracer.debug:
+                    tracer.log(f"Line {line_num}: Matched syllable '{syllable.sequence}' to '{corresponding_syl}' in '{w}'")
+                
+                segment = w[start_idx:end_idx + 1]
+                if tracer.debug:
+                    tracer.log(f"Line {line_num}: Segment for '{syllable.sequence}': '{segment}'")
+                candidates = [i for i in range(start_idx, end_idx + 1) 
+                             if w[i] in DICHRONA]
+                if candidates and word_with_real_dichrona(segment):
+                    if tracer.debug:
+                        tracer.log(f"Line {line_num}: Dichrona candidates in '{segment}' at indices {candidates} (chars: {[w[i] for i in candidates]}), word_with_real_dichrona={word_with_real_dichrona(segment)}")
+                    i_max = max(candidates)
+                    if (syllable.heavy and 
+                        is_open_syllable_in_word_in_synapheia(corresponding_syl, syllabification, next_word)):
+                        insertion_dict[i_max] = '_'
+                        if tracer.debug:
+                            tracer.log(f"Line {line_num}: Inserting '_' at index {i_max} for heavy syllable")
+                    elif not syllable.heavy:
+                        insertion_dict[i_max] = '^'
+                        if tracer.debug:
+                            tracer.log(f"Line {line_num}: Inserting '^' at index {i_max} for light syllable")
+                else:
+                    if tracer.debug:
+                        tracer.log(f"Line {line_num}: No valid dichrona candidates in '{segment}' (candidates: {candidates}, word_with_real_dichrona={word_with_real_dichrona(segment)})")
+            
+            if insertion_dict:
+                marked_w = ''
+                for j in range(len(w)):
+                    marked_w += w[j]
+                    if j in insertion_dict:
+                        marked_w += insertion_dict[j]
+                if tracer.debug:
+                    tracer.log(f"Line {line_num}: Marked word: '{marked_w}'")
+                output_list.append(marked_w)
+        else:
+            if tracer.debug:
+                tracer.log(f"Line {line_num}: Word '{w}' failed checks (dichrona={dichrona_count}, open_syll={has_open_syll})")
+
+    return output_list
+
@@ -0,0 +1,168 @@
+'''
+The harvested macrons and breves as a lexicon of word types rather than of token occurrences.
+
+hypotactic_macrons.tsv has one line per unmarked form, sorted by form, followed by every marking
+that form was harvested with and how many times, most frequent first:
+
+Αἰήταο	Αἰήτα_ο	35	Αἰήτα^ο	1
+ἀδινῶν	ἀ^δι^νῶν	1
+
+Forms whose tokens were marked in conflicting ways, like Αἰήταο above, simply have more than one
+marking, so that nothing is overwritten. The file is plain text, and it is only opened when the
+lexicon is first consulted: a lookup is a binary search over the memory-mapped file, e.g.
+
+lexicon = MacronLexicon()
+lexicon['Αἰήταο']              # 'Αἰήτα_ο', the most frequent marking
+lexicon.markings('Αἰήταο')     # [('Αἰήτα_ο', 35), ('Αἰήτα^ο', 1)]
+'''
+
+from collections import Counter, defaultdict
+from pathlib import Path
+import mmap
+
+LEXICON_FILE = Path(__file__).resolve().parent / 'hypotactic_macrons.tsv'
+
+
+def unmarked(word):
+    return word.replace('^', '').replace('_', '')
+
+
+def count_markings(marked_words, counts=None):
+    '''
+    Tallies the markings of every form, {form: Counter({marked: count})}.
+    marked_words may be any iterable, so that it can be counted as it is harvested.
+    '''
+    if counts is None:
+        counts = defaultdict(Counter)
+    for word in marked_words:
+        counts[unmarked(word)][word] += 1
+    return counts
+
+
+def write_lexicon(counts, f):
+    '''
+    Writes the tallies of count_markings to the open text file f, returning the number of forms.
+    '''
+    # Sorting str and sorting its UTF-8 encoding give the same order, which the lookups rely on
+    for form in sorted(counts):
+        markings = sorted(counts[form].items(), key=lambda item: (-item[1], item[0]))
+        f.write(form + ''.join(f'\t{marked}\t{count}' for marked, count in markings) + '\n')
+    return len(counts)
+
+
+def save_lexicon(marked_words, path=LEXICON_FILE):
+    counts = count_markings(marked_words)
+    with open(path, 'w', encoding='utf-8') as f:
+        return write_lexicon(counts, f)
+
+
+def parse_entry(entry):
+    fields = entry.rstrip('\n').split('\t')
+    return fields[0], [(marked, int(count)) for marked, count in zip(fields[1::2], fields[2::2])]
+
+
+def read_lexicon(path=LEXICON_FILE):
+    '''
+    Yields (form, [(marked, count), ...]) for every form, in order.
+    '''
+    with open(path, encoding='utf-8') as f:
+        for entry in f:
+            yield parse_entry(entry)
+
+
+def merge_lexicons(paths, f):
+    '''
+    Adds up several lexicon files, e.g. one per work, and writes the result to the open text file f.
+    '''
+    counts = defaultdict(Counter)
+    for path in paths:
+        for form, markings in read_lexicon(path):
+            for marked, count in markings:
+                counts[form][marked] += count
+    return write_lexicon(counts, f)
+
+
+class MacronLexicon:
+    '''
+    Read-only, lazily opened view of a lexicon file.
+    '''
+
+    def __init__(self, path=LEXICON_FILE):
+        self.path = Path(path)
+        self.data = None
+
+    def _data(self):
+        if self.data is None:
+            with open(self.path, 'rb') as f:
+                if f.seek(0, 2) == 0:
+                    self.data = b''
+                else:
+                    self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.data
+
+    def _find(self, form):
+        '''
+        The line of form, or None.
+        '''
+        data = self._data()
+        key = form.encode('utf-8')
+        lo, hi = 0, len(data)
+        # Invariant: lo and hi are line starts, every line before lo sorts before key, and none from hi on does
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = data.rfind(b'\n', 0, mid) + 1
+            end = data.find(b'\n', start)
+            if end == -1:
+                end = len(data)
+            tab = data.find(b'\t', start, end)
+            if data[start:tab if tab != -1 else end] < key:
+                lo = end + 1
+            else:
+                hi = start
+        end = data.find(b'\n', lo)
+        if end == -1:
+            end = len(data)
+        entry = data[lo:end]
+        if entry.split(b'\t', 1)[0] != key:
+            return None
+        return entry.decode('utf-8')
+
+    def markings(self, form):
+        '''
+        Every marking of the unmarked form with its count, most frequent first, or [] if unknown.
+        '''
+        entry = self._find(form)
+        return parse_entry(entry)[1] if entry is not None else []
+
+    def get(self, form, default=None):
+        markings = self.markings(form)
+        return markings[0][0] if markings else default
+
+    def __getitem__(self, form):
+        markings = self.markings(form)
+        if not markings:
+            raise KeyError(form)
+        return markings[0][0]
+
+    def __contains__(self, form):
+        return self._find(form) is not None
+
+    def __iter__(self):
+        for form, _ in read_lexicon(self.path):
+            yield form
+
+    def items(self):
+        return read_lexicon(self.path)
+
+    def conflicts(self):
+        '''
+        Yields (form, markings) for every form that was marked in more than one way.
+        '''
+        for form, markings in read_lexicon(self.path):
+            if len(markings) > 1:
+                yield form, markings
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.data = None
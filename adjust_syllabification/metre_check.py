@@ -0,0 +1,363 @@
+'''
+Finds the lines of the reshuffled corpus that no longer scan, so that macron extraction can skip them:
+
+python adjust_syllabification/metre_check.py                      # hypotactic_all_shuffled_cleaned.txt
+python adjust_syllabification/metre_check.py --metre hexameter    # all lines are hexameters, no need for the HTML
+
+Every metre is compiled into a finite automaton over weights (see METRES), and the automata of all
+metres are merged into one transition table, so that the whole corpus is run through it at once,
+one syllable position at a time for all lines together (see Automata.run).
+
+The weights checked are not simply the brackets: a syllable that the reshuffle has closed, i.e.
+that ends in a consonant, is heavy whatever its bracket says. This is how mute-with-liquid (or nasal)
+clusters split between syllables show up, e.g. in
+
+[μοῦ]{σά} {μοι} [ἔν]{νε}{πε} [ἔρ]{γα} {πο}[λυχ][ρύ][σου] {Ἀφ}{ρο}[δί][της]
+
+{Ἀφ}{ρο} is heavy plus light, which no hexameter has in the fifth foot. Note that a closed syllable
+in an anceps position scans either way, and is thus not flagged.
+
+The metre of every line is its data-metre in the HTML files, found by matching the lines' text in
+order (lines of metres without an automaton, e.g. the lyric ones, are left unchecked). The lines
+that do not scan are written to a sidecar file, one JSON record per line, with the line number in
+the input, the position (0-based) of the first syllable the metre does not allow, the weights it
+would have allowed there (an empty expected means the line should have ended before it), and the
+positions of the closed syllables scanned light, which are usually what went wrong, e.g.
+
+{"line": 1, "metre": "hexameter", "position": 13, "expected": "-", "found": "u", "syllable": "ρο", "closed": [12], "text": "..."}
+
+A position equal to the number of syllables means that the line ended too early.
+extract_macrons_from_open_sylls.py --skip-nonconforming skips these lines.
+'''
+
+from collections import defaultdict, deque
+from pathlib import Path
+import argparse
+import json
+import re
+
+import numpy as np
+
+import tracing
+from corpus import Line
+from hypotactic_html import iter_formatted_lines
+from reshuffle import greek_punctuation, is_vowel
+from tracing import tracer
+
+REPO = Path(__file__).resolve().parent.parent
+HTML_DIR = REPO / 'hypotactic_htmls_greek'
+
+input_file = Path(__file__).resolve().parent / 'hypotactic_all_shuffled_cleaned.txt'
+output_file = Path(__file__).resolve().parent / 'hypotactic_all_shuffled_nonconforming.jsonl'
+
+LIGHT = 0
+HEAVY = 1
+SYMBOLS = '-u'  # as in the tsv patterns
+WEIGHT_OF = {'u': LIGHT, '-': HEAVY}
+DEAD = 0  # the state of every automaton that no weight leads out of
+
+# Elements, as the weights they may be filled with
+LONGUM = ('-',)
+BREVE = ('u',)
+ANCEPS = ('-', 'u')
+BICEPS = ('uu', '-')  # two breves, or one longum in their place
+RESOLVABLE = ('-', 'uu')  # a longum, or two breves in its place
+FREE = ('-', 'u', 'uu')  # an anceps, resolved or not
+
+DACTYL = [LONGUM, BICEPS]
+IAMBIC_METRON = [FREE, RESOLVABLE, BREVE, RESOLVABLE]
+TROCHAIC_METRON = [RESOLVABLE, BREVE, RESOLVABLE, FREE]
+ANAPAESTIC_METRON = [BICEPS, RESOLVABLE, BICEPS, RESOLVABLE]
+
+HEXAMETER = DACTYL * 5 + [LONGUM, LONGUM]
+PENTAMETER = DACTYL * 2 + [LONGUM] + [LONGUM, BREVE, BREVE] * 2 + [LONGUM]
+
+'''
+Every metre as its alternative sequences of elements, keyed by data-metre. The last element of a
+line may always end in a light syllable instead of a heavy one (brevis in longo). The resolutions
+are those of comedy, so the checker errs on the side of letting lines through.
+'''
+METRES = {
+    'hexameter': [HEXAMETER],
+    'pentameter': [PENTAMETER],
+    'elegy': [HEXAMETER, PENTAMETER],
+    'ia6': [IAMBIC_METRON * 3],
+    'ia6g': [IAMBIC_METRON * 3],
+    'ia4': [IAMBIC_METRON * 2],
+    'ia2': [IAMBIC_METRON],
+    'tr7': [TROCHAIC_METRON * 3 + [RESOLVABLE, BREVE, LONGUM]],
+    'an4': [ANAPAESTIC_METRON * 2],
+    'an2': [ANAPAESTIC_METRON],
+    'an4cat': [ANAPAESTIC_METRON + [BICEPS, LONGUM, LONGUM]],
+}
+
+# The metres of the tsv files, by data-metre
+METRE_ALIASES = {
+    'dactylic hexameter': 'hexameter',
+    'dactylic pentameter': 'pentameter',
+    'iambic trimeter (tragic)': 'ia6g',
+}
+
+
+def final(element):
+    '''
+    The last element of a line, which may end light where it would otherwise end heavy.
+    '''
+    return tuple(dict.fromkeys(element + tuple(weights[:-1] + 'u' for weights in element if weights.endswith('-'))))
+
+
+def compile_metre(alternatives):
+    '''
+    Compiles the alternative element sequences of a metre into a deterministic automaton, by subset
+    construction from the nondeterministic one that has a chain of states for every way of filling
+    every element. Returns (table, accepting, start), table being a list of [light, heavy] successors,
+    with DEAD as state 0.
+    '''
+    # Nondeterministic automaton: transitions[state][weight] = set of states
+    transitions = [[set(), set()]]
+    ends = set()
+    for elements in alternatives:
+        elements = elements[:-1] + [final(elements[-1])]
+        current = 0
+        for element in elements:
+            after = len(transitions)
+            transitions.append([set(), set()])
+            for weights in element:
+                state = current
+                for weight in weights[:-1]:
+                    transitions.append([set(), set()])
+                    transitions[state][WEIGHT_OF[weight]].add(len(transitions) - 1)
+                    state = len(transitions) - 1
+                transitions[state][WEIGHT_OF[weights[-1]]].add(after)
+            current = after
+        ends.add(current)
+
+    start = frozenset([0])
+    states = {frozenset(): DEAD, start: 1}
+    table = [[DEAD, DEAD], None]
+    accepting = [False, bool(start & ends)]
+    queue = deque([start])
+    while queue:
+        subset = queue.popleft()
+        row = []
+        for weight in (LIGHT, HEAVY):
+            successor = frozenset(target for state in subset for target in transitions[state][weight])
+            if successor not in states:
+                states[successor] = len(table)
+                table.append(None)
+                accepting.append(bool(successor & ends))
+                queue.append(successor)
+            row.append(states[successor])
+        table[states[subset]] = row
+    return table, accepting, 1
+
+
+class Automata:
+    '''
+    The automata of several metres in one transition table, sharing the DEAD state.
+    '''
+
+    def __init__(self, metres=METRES):
+        table = [[DEAD, DEAD]]
+        accepting = [False]
+        self.start = {}
+        for name, alternatives in metres.items():
+            metre_table, metre_accepting, metre_start = compile_metre(alternatives)
+            offset = len(table) - 1  # every state but DEAD gets renumbered
+            table += [[state + offset if state != DEAD else DEAD for state in row] for row in metre_table[1:]]
+            accepting += metre_accepting[1:]
+            self.start[name] = metre_start + offset
+        self.table = np.array(table, dtype=np.int32)
+        self.accepting = np.array(accepting, dtype=bool)
+
+    def start_state(self, metre):
+        '''
+        The start state of metre (a data-metre or a tsv metre), or DEAD if it has no automaton.
+        '''
+        return self.start.get(METRE_ALIASES.get(metre, metre), DEAD)
+
+    def run(self, weights, offsets, metres):
+        '''
+        Runs every line through the automaton of its metre, all lines at once. weights holds the
+        weights of all lines one after the other, offsets the index of the first weight of every line
+        plus one past the last. Returns
+
+        checked: False for the lines whose metre has no automaton
+        ok: True for the lines that scan
+        positions: for the lines that do not, the first position their metre does not allow
+        expected: the weights allowed there, as a bit mask (1 << LIGHT | 1 << HEAVY)
+        '''
+        lengths = np.diff(offsets)
+        n = len(lengths)
+        starts = {metre: self.start_state(metre) for metre in set(metres)}
+        start = np.array([starts[metre] for metre in metres], dtype=np.int32)
+        checked = start != DEAD
+        width = int(lengths[checked].max(initial=0))
+
+        # One row per line, padded with LIGHT where there are no syllables left
+        matrix = np.zeros((n, width), dtype=np.int8)
+        line = np.repeat(np.arange(n), lengths)
+        columns = np.arange(len(weights)) - offsets[line]
+        keep = columns < width
+        matrix[line[keep], columns[keep]] = weights[keep]
+
+        state = start.copy()
+        positions = np.where(checked, lengths, -1)
+        expected = np.zeros(n, dtype=np.int8)
+        for column in range(width):
+            active = (column < lengths) & (state != DEAD)
+            following = self.table[state, matrix[:, column]]
+            died = active & (following == DEAD)
+            positions[died] = column
+            expected[died] = (self.table[state[died], LIGHT] != DEAD) | (self.table[state[died], HEAVY] != DEAD) << 1
+            state = np.where(active, following, state)
+
+        ok = checked & (state != DEAD) & self.accepting[state]
+        ended = checked & ~ok & (state != DEAD)  # all syllables allowed, but the line should go on
+        expected[ended] = (self.table[state[ended], LIGHT] != DEAD) | (self.table[state[ended], HEAVY] != DEAD) << 1
+        return checked, ok, positions, expected
+
+
+def scansion_patterns(text):
+    '''
+    The weights of every line of text (in the [heavy]{light} notation), one line of - and u per
+    line, with closed syllables heavy whatever their brackets say. Works on the whole text at once:
+
+    >>> scansion_patterns('[μοῦ]{σά} {μοι} [ἔν]{νε}\\n{Ἀφ}{ρο}[δί][της]\\n')
+    '-uu-u\\n-u--\\n'
+    '''
+    text = closed_pattern.sub('-', text)
+    text = heavy_pattern.sub('-', text)
+    text = light_pattern.sub('u', text)
+    return text.translate(strip_table)
+
+
+consonant_set = frozenset(chr(c) for c in [*range(0x370, 0x400), *range(0x1f00, 0x2000)] if chr(c).isalpha() and not is_vowel(chr(c)))
+consonants = ''.join(sorted(consonant_set))
+closed_pattern = re.compile(r'\{[^}\n]*[' + consonants + r']\s*\}')
+heavy_pattern = re.compile(r'\[[^\]\n]+\]')  # as in corpus.syllable_pattern
+light_pattern = re.compile(r'\{[^}\n]+\}')
+strip_table = defaultdict(lambda: None, {ord('-'): '-', ord('u'): 'u', ord('\n'): '\n'})
+
+
+def closed_syllables(line):
+    '''
+    The positions of the syllables of line (a Line) that are scanned light, but end in a consonant.
+    '''
+    return [syllable.index for syllable in line if not syllable.heavy and syllable.text.rstrip()[-1:] in consonant_set]
+
+
+def text_key(line):
+    '''
+    The letters of a line, which the reshuffle and the bracket check leave as they are.
+    '''
+    return ''.join(re.sub(greek_punctuation, '', line).split())
+
+
+def html_metres(html_files):
+    '''
+    The data-metre of every line of html_files, by text_key, in document order.
+    '''
+    metres = defaultdict(deque)
+    for html_file in html_files:
+        for attrs, formatted in iter_formatted_lines(html_file):
+            metres[text_key(formatted)].append(attrs.get('data-metre') or None)
+    return metres
+
+
+def line_metres(lines, html_files):
+    '''
+    The metre of every line, taking the lines of the same text in the order they occur in the HTML.
+    '''
+    metres = html_metres(html_files)
+    result = []
+    for line in lines:
+        candidates = metres.get(text_key(line))
+        if not candidates:
+            result.append(None)
+            continue
+        result.append(candidates.popleft() if len(candidates) > 1 else candidates[0])
+    return result
+
+
+def check_lines(lines, metres, automata=None):
+    '''
+    Checks the scanned lines against their metres. Returns (checked, ok, positions, expected) as
+    in Automata.run.
+    '''
+    automata = automata or Automata()
+    patterns = scansion_patterns(''.join(line.rstrip('\n') + '\n' for line in lines))
+    chars = np.frombuffer(patterns.encode('ascii'), dtype=np.uint8)
+    newlines = chars == ord('\n')
+    weights = (chars[~newlines] == ord('-')).astype(np.int8)
+    lengths = np.diff(np.flatnonzero(np.concatenate([[True], newlines]))) - 1
+    offsets = np.zeros(len(lines) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return automata.run(weights, offsets, metres)
+
+
+def expected_weights(mask):
+    return ''.join(symbol for symbol, weight in zip(SYMBOLS, (HEAVY, LIGHT)) if mask >> weight & 1)
+
+
+def check_file(input_file, output_file, metre=None, html_files=None):
+    '''
+    Writes the lines of input_file that do not scan to output_file. Returns the numbers of
+    checked and nonconforming lines.
+    '''
+    with open(input_file, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    if metre is not None:
+        metres = [metre] * len(lines)
+    else:
+        metres = line_metres(lines, html_files or sorted(HTML_DIR.glob('*.html')))
+    checked, ok, positions, expected = check_lines(lines, metres)
+
+    counts = defaultdict(lambda: [0, 0])
+    with open(output_file, 'w', encoding='utf-8') as out:
+        for index in np.flatnonzero(checked):
+            counts[metres[index]][0] += 1
+            if ok[index]:
+                continue
+            counts[metres[index]][1] += 1
+            line = Line.parse(lines[index])
+            position = int(positions[index])
+            syllable = line[position] if position < len(line) else None
+            closed = closed_syllables(line)
+            out.write(json.dumps({
+                'line': int(index) + 1,
+                'metre': metres[index],
+                'position': position,
+                'expected': expected_weights(expected[index]),
+                'found': ('-' if syllable.heavy or position in closed else 'u') if syllable else '',
+                'syllable': syllable.text if syllable else '',
+                'closed': closed,
+                'text': lines[index],
+            }, ensure_ascii=False) + '\n')
+    for name, (total, nonconforming) in sorted(counts.items(), key=lambda item: -item[1][0]):
+        tracer.info(f"{name}: {nonconforming} of {total} lines do not scan")
+    return int(checked.sum()), int(checked.sum() - ok.sum())
+
+
+def load_nonconforming(path=output_file):
+    '''
+    The line numbers in a sidecar file written by check_file.
+    '''
+    with open(path, encoding='utf-8') as f:
+        return {json.loads(record)['line'] for record in f}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Find the lines of the reshuffled corpus that do not scan in their metre.')
+    parser.add_argument('input', nargs='?', default=input_file, help=f'default: {input_file.name}')
+    parser.add_argument('output', nargs='?', default=output_file, help=f'default: {output_file.name}')
+    parser.add_argument('--metre', choices=sorted(METRES), help='check every line in this metre, instead of the one in the HTML files')
+    parser.add_argument('--html', nargs='*', type=Path, help=f'HTML files to take the metres from (default: all of {HTML_DIR.name}/)')
+    tracing.add_arguments(parser)
+    args = parser.parse_args()
+    tracing.configure(args)
+
+    checked, nonconforming = check_file(args.input, args.output, args.metre, args.html)
+    tracer.info(f"Checked {checked} line(s), {nonconforming} do not scan (see {args.output}).")
+    tracer.count('nonconforming', nonconforming)
+    tracing.finish(args)
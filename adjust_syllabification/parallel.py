@@ -0,0 +1,30 @@
+'''
+Order-preserving chunked map over a process pool, for the stages with a --jobs option.
+
+Chunks are read from the input only as results are taken, so memory use does not grow with the
+number of lines, unlike with Pool.imap, whose task thread drains the whole input at once.
+'''
+
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool
+
+
+def map_chunks(worker, lines, jobs, chunk_size, initializer=None):
+    '''
+    Yields (chunk, worker(chunk)) for consecutive chunks of chunk_size lines, in input order, computed
+    in a pool of jobs processes. At most two chunks per worker are in flight at a time.
+    '''
+    iterator = iter(lines)
+    pending = deque()
+    with Pool(jobs, initializer) as pool:
+        while True:
+            while len(pending) < 2 * jobs:
+                chunk = list(islice(iterator, chunk_size))
+                if not chunk:
+                    break
+                pending.append((chunk, pool.apply_async(worker, (chunk,))))
+            if not pending:
+                return
+            chunk, result = pending.popleft()
+            yield chunk, result.get()
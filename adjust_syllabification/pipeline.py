@@ -0,0 +1,170 @@
+'''
+The whole adjustment in a single process: HTML extraction → reshuffle → bracket check → macron harvest.
+
+The stages are chained as generators, so one line at a time flows from the HTML files all the way
+to hypotactic_macrons.tsv, and memory stays flat however large the corpus is. The intermediate
+hypotactic_all_*.txt files are only written when asked for, e.g. for debugging:
+
+python adjust_syllabification/pipeline.py --intermediates adjust_syllabification
+
+At the end, wall time, lines in and out and rejects are reported for every stage.
+See tracing.py for --debug, --trace, --profile and --metrics.
+'''
+
+from pathlib import Path
+import argparse
+import time
+
+import grc_cache
+import tracing
+from brackets import bracket_errors
+from grc_cache import load_caches, print_cache_stats, save_caches
+from hypotactic_html import formatted_parts, iter_html_lines
+from macron_harvest import harvest_line
+from macron_lexicon import save_lexicon
+from reshuffle import OUTCOME_COUNTERS, reshuffle_line
+from tracing import tracer
+
+REPO = Path(__file__).resolve().parent.parent
+HTML_DIR = REPO / 'hypotactic_htmls_greek'
+OUTPUT_FILE = REPO / 'adjust_syllabification' / 'hypotactic_macrons.tsv'
+
+
+class StageStats:
+    '''
+    Bookkeeping for one stage. seconds only counts time spent in the stage itself, not upstream.
+    '''
+
+    def __init__(self, name):
+        self.name = name
+        self.lines_in = 0
+        self.lines_out = 0
+        self.rejects = 0
+        self.seconds = 0.0
+
+    def __str__(self):
+        return f"{self.name:<10} {self.seconds:8.2f}s {self.lines_in:>8} in {self.lines_out:>8} out {self.rejects:>6} rejected"
+
+
+def extract(html_files, stats):
+    for html_file in html_files:
+        html_lines = iter_html_lines(html_file)
+        while True:
+            start = time.perf_counter()
+            line = next(html_lines, None)
+            parts = formatted_parts(line) if line is not None else None
+            stats.seconds += time.perf_counter() - start
+            if line is None:
+                break
+            stats.lines_in += 1
+            if not parts:
+                stats.rejects += 1
+                continue
+            for part in parts:
+                stats.lines_out += 1
+                yield part
+
+
+def map_stage(fn, lines, stats):
+    '''
+    Applies fn to every line; a result of None counts as a reject.
+    '''
+    for line in lines:
+        stats.lines_in += 1
+        start = time.perf_counter()
+        result = tracer.profile(stats.name, fn, line)
+        stats.seconds += time.perf_counter() - start
+        if result is None:
+            stats.rejects += 1
+            continue
+        stats.lines_out += 1
+        yield result
+
+
+def reshuffle(line):
+    outcome, shuffled = reshuffle_line(line)
+    tracer.count(OUTCOME_COUNTERS[outcome])
+    tracer.record(stage='reshuffle', outcome=outcome, input=line, output=shuffled)
+    return shuffled
+
+
+def check_brackets(line):
+    errors = bracket_errors(line)
+    if errors:
+        tracer.count('bracket_errors')
+        tracer.record(stage='brackets', input=line, errors=errors)
+        return None
+    return line
+
+
+def harvest(lines, stats):
+    '''
+    Unlike the other stages, yields marked words rather than lines.
+    '''
+    for line_num, line in enumerate(lines, 1):
+        stats.lines_in += 1
+        start = time.perf_counter()
+        marked_words = tracer.profile(stats.name, harvest_line, line, line_num)
+        stats.seconds += time.perf_counter() - start
+        tracer.record(stage='macrons', line=line_num, input=line, marked=marked_words)
+        stats.lines_out += len(marked_words)
+        yield from marked_words
+
+
+def tee_to_file(lines, path, trailing_newline=True):
+    '''
+    Passes lines through unchanged, writing them to path on the way.
+    '''
+    with open(path, 'w', encoding='utf-8') as f:
+        for i, line in enumerate(lines):
+            if trailing_newline:
+                f.write(line + '\n')
+            else:
+                # hypotactic_all_raw.txt has no trailing newline
+                f.write(line if i == 0 else '\n' + line)
+            yield line
+
+
+def run(html_files, output_file=OUTPUT_FILE, intermediates=None):
+    stats = [StageStats(name) for name in ('extract', 'reshuffle', 'brackets', 'macrons')]
+    extract_stats, reshuffle_stats, bracket_stats, macron_stats = stats
+
+    lines = extract(html_files, extract_stats)
+    if intermediates:
+        lines = tee_to_file(lines, intermediates / 'hypotactic_all_raw.txt', trailing_newline=False)
+    lines = map_stage(reshuffle, lines, reshuffle_stats)
+    if intermediates:
+        lines = tee_to_file(lines, intermediates / 'hypotactic_all_shuffled.txt')
+    lines = map_stage(check_brackets, lines, bracket_stats)
+    if intermediates:
+        lines = tee_to_file(lines, intermediates / 'hypotactic_all_shuffled_cleaned.txt')
+    marked_words = harvest(lines, macron_stats)
+
+    start = time.perf_counter()
+    entries = save_lexicon(marked_words, output_file)
+    total = time.perf_counter() - start
+
+    for stage in stats:
+        tracer.info(str(stage))
+    tracer.info(f"Done in {total:.2f}s. {entries} forms written to {output_file}")
+    if tracer.level >= tracing.INFO:
+        print_cache_stats()
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the whole syllabification adjustment and macron harvest in one process.')
+    parser.add_argument('html_files', nargs='*', type=Path, help=f'HTML files to process (default: all of {HTML_DIR.name}/)')
+    parser.add_argument('--output', type=Path, default=OUTPUT_FILE, help='where to write the macron lexicon')
+    parser.add_argument('--intermediates', type=Path, metavar='DIR', help='also write the hypotactic_all_*.txt files to DIR')
+    grc_cache.add_arguments(parser)
+    tracing.add_arguments(parser)
+    args = parser.parse_args()
+    tracing.configure(args)
+
+    if args.persist_cache:
+        load_caches()
+    run(args.html_files or sorted(HTML_DIR.glob('*.html')), args.output, args.intermediates)
+    if args.persist_cache:
+        save_caches()
+    tracing.finish(args)
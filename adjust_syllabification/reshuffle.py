@@ -0,0 +1,298 @@
+'''
+Updating human scanned Ancient Greek verse to use my machine syllabification,
+by reshuffling coda and onset characters between syllables (without changing their weight).
+
+The original syllabification, e.g.
+
+[ὦ] [παῖ,] {τέ}[λος] [μὲν] [Ζεὺς] {ἔ}[χει] {βα}[ρύ]{κτυ}[πος]
+[πάν][των] {ὅσ᾽} [ἔ]{στι,} [καὶ] {τί}[θησ᾽] {ὅ}[κῃ] {θέ}[λει·]
+[ᾗ] [δὴ] {βο}[τὰ] {ζό}[ω]{μεν,} [οὐ]{δὲν} [εἰ]{δό}[τες]
+{ὅ}[κως] {ἕ}[κα]{στον} [ἐ]{κτε}[λευ][τή][σει] {θε}[ός.]
+
+should become:
+
+[ὦ] [παῖ,] {τέ}[λος] [μὲν] [Ζεὺ]{ς ἔ}[χει] {βα}[ρύκ]{τυ}[πος]
+[πάν][των] {ὅσ᾽} [ἔσ]{τι,} [καὶ] {τί}[θη]{σ᾽ ὅ}[κῃ] {θέ}[λει·]
+[ᾗ] [δὴ] {βο}[τὰ ζ]{ό}[ω]{με}[ν, οὐ]{δὲ}[ν εἰ]{δό}[τες]
+{ὅ}[κως] {ἕ}[κασ]{τον} [ἐκ]{τε}[λευ][τή][σει] {θε}[ός.]
+
+Every line is parsed once into a corpus.Line, whose letters() are what the syllabifier sees; the
+boundaries are moved to the syllabifier's on the same offsets (align_boundaries), and the line with
+the new boundaries (Line.with_boundaries) is written back out. A boundary only moves within
+the run of consonants it is in, so lines where the syllabifier counts a different number of
+syllables than the scansion (synizesis etc.) are aligned as well.
+
+The syllabifier always splits a mute followed by a liquid or nasal (muta cum liquida) between two
+syllables, e.g. πατ-ρός, whereas the poets, epic ones especially, scan it both ways. So for every
+such cluster both splits are tried, and the one that agrees with the weight the syllable is scanned
+with is kept (resolve_muta_cum_liquida): {πα}[τρὸς] stays as it is, rather than becoming the
+impossible {πατ}[ρὸς], a closed light syllable. The decisions are memoized by the vowel and
+consonants around the boundary, which the corpus repeats over and over. --heterosyllabic turns
+this off.
+'''
+
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from functools import partial
+
+from corpus import Line
+from grc_cache import merge_updates, register, syllabify_line, take_updates, track_updates
+from parallel import map_chunks
+from tracing import tracer
+
+greek_punctuation_except_scansion = r'[\t·\u0387\u037e\u00b7\.,!?;:ʼ’᾽\"()<>\-—…†]'
+greek_punctuation = r'[\xa0\t·\u0387\u037e\u00b7\.,!?;:ʼ’᾽\"()\[\]{}<>\-—…†]'
+# Closing brackets doubled, as in [λον.]] or {γα]}, where a bracket was part of the text; the last one is kept
+doubled_bracket_pattern = re.compile(r'[\]}]+([\]}])')
+
+# The counter each outcome of reshuffle_line is tallied under
+OUTCOME_COUNTERS = {
+    'empty': 'empty',
+    'length_error': 'length_errors',
+    'unchanged': 'unchanged',
+    'updated': 'updated',
+    'realigned': 'realigned',
+}
+
+VOWEL_LETTERS = set('αεηιουω')
+MUTES = set('πβφτδθκγχ')
+LIQUIDS_AND_NASALS = set('λρμν')
+SHORT_VOWELS = set('εο')
+
+
+def base_letter(char):
+    '''
+    char without its diacritics, in lower case, e.g. ο for Ὄ.
+    '''
+    return unicodedata.normalize('NFD', char)[:1].lower()
+
+
+def is_vowel(char):
+    '''
+    Whether char is a vowel, whatever its diacritics, e.g. Ὄ or ῷ.
+    '''
+    return base_letter(char) in VOWEL_LETTERS
+
+
+# Every vowel of the Greek and Greek Extended blocks
+vowel_pattern = re.compile('[' + ''.join(chr(c) for c in [*range(0x370, 0x400), *range(0x1f00, 0x2000)] if is_vowel(chr(c))) + ']')
+
+
+def vowel_offsets(text):
+    return [match.start() for match in vowel_pattern.finditer(text)]
+
+
+def align_boundaries(text, hypotactic_ends, syllabifier_ends, vowels=None):
+    '''
+    Moves every boundary between two scanned syllables to the syllabifier's boundary between the
+    same two vowels, i.e. within the same run of consonants, so that only codas and onsets move and
+    every syllable keeps its vowel (and weight). A boundary with no syllabifier boundary in its run,
+    e.g. in a hiatus that the syllabifier reads as a diphthong, stays where it is; this is what lets
+    lines whose syllable counts differ (synizesis, synaloepha) be aligned too.
+
+    >>> align_boundaries('Ζεὺςἔχει', [4, 5, 8], [3, 5, 8])
+    [3, 5, 8]
+    >>> align_boundaries('ῥηιδίως', [2, 3, 5, 7], [3, 5, 7])
+    [2, 3, 5, 7]
+
+    Returns None if the boundaries cannot be aligned, e.g. because a syllable would be left empty.
+    '''
+    n = len(text)
+    if vowels is None:
+        vowels = vowel_offsets(text)
+    aligned = []
+    m = len(syllabifier_ends)
+    j = 0
+    for boundary in hypotactic_ends[:-1]:
+        # The run of consonants around the boundary, from just after the vowel before it to the vowel after it
+        v = bisect_left(vowels, boundary)
+        low = vowels[v - 1] + 1 if v > 0 else 0
+        high = vowels[v] if v < len(vowels) else n
+        while j < m and syllabifier_ends[j] < low:
+            j += 1
+        # The syllabifier's boundary in the same run, the nearest one should there be several
+        best = None
+        k = j
+        while k < m and syllabifier_ends[k] <= high:
+            if best is None or abs(syllabifier_ends[k] - boundary) < abs(best - boundary):
+                best = syllabifier_ends[k]
+            k += 1
+        if best is not None:
+            boundary = best
+        if aligned and boundary <= aligned[-1] or boundary == 0:
+            return None
+        aligned.append(boundary)
+    if aligned and aligned[-1] >= n:
+        return None
+    aligned.append(hypotactic_ends[-1])
+    return aligned
+
+
+def is_muta_cum_liquida(cluster):
+    '''
+    Whether cluster is a mute followed by a liquid or nasal, e.g.
+
+    >>> is_muta_cum_liquida('τρ'), is_muta_cum_liquida('φρ'), is_muta_cum_liquida('στ')
+    (True, True, False)
+    '''
+    return len(cluster) == 2 and base_letter(cluster[0]) in MUTES and base_letter(cluster[1]) in LIQUIDS_AND_NASALS
+
+
+def scans_as(nucleus, coda, heavy):
+    '''
+    Whether a syllable with nucleus (its last vowel) and coda can have the weight it is scanned with:
+    a closed syllable is always heavy, and an open one with a short vowel (ε, ο) always light.
+    '''
+    if coda:
+        return heavy
+    return not heavy or base_letter(nucleus) not in SHORT_VOWELS
+
+
+# Not persisted, as the decisions change with the rules below rather than with grc_utils
+cluster_splits = register('split_cluster', persist=False)
+
+
+def split_cluster(nucleus, coda, onset, heavy):
+    '''
+    Where the consonants between nucleus and the next vowel are split, as the length of the coda.
+    The syllabifier splits a mute with a liquid or nasal (muta cum liquida) between the syllables,
+    which is not always how the line is scanned: the alternatives are enumerated, and the first one
+    that lets the syllable have its weight wins, the syllabifier's split if it does.
+
+    >>> split_cluster('α', 'τ', 'ρ', False)  # {πα}[τρὸς], not {πατ}[ρὸς]
+    0
+    >>> split_cluster('α', 'τ', 'ρ', True)  # [πατ]{ρὸς}
+    1
+    >>> split_cluster('ε', '', 'τρ', True)  # [ἐτ]{ρά}..., not [ἐ]{τρά}
+    1
+    '''
+    return cluster_splits.get((nucleus, coda, onset, heavy), lambda: _split_cluster(nucleus, coda, onset, heavy))
+
+
+def _split_cluster(nucleus, coda, onset, heavy):
+    consonants = coda + onset
+    candidates = [len(coda)]
+    if is_muta_cum_liquida(consonants[-2:]):
+        candidates += [len(consonants) - 2, len(consonants) - 1]  # together in the onset, or split
+    for candidate in candidates:
+        if scans_as(nucleus, consonants[:candidate], heavy):
+            return candidate
+    return len(coda)
+
+
+def resolve_muta_cum_liquida(text, ends, line, vowels=None):
+    '''
+    Moves the boundaries in muta cum liquida clusters (see split_cluster) of the aligned syllables of
+    line, in place; text and ends are as in align_boundaries.
+    '''
+    if vowels is None:
+        vowels = vowel_offsets(text)
+    for i in range(len(ends) - 1):
+        boundary = ends[i]
+        v = bisect_left(vowels, boundary)
+        if v == 0 or v == len(vowels):
+            continue
+        nucleus = vowels[v - 1]
+        following = vowels[v]
+        if following - nucleus < 3 or nucleus < (ends[i - 1] if i else 0) or following >= ends[i + 1]:
+            continue  # fewer than two consonants, or a syllable without a vowel
+        ends[i] = nucleus + 1 + split_cluster(text[nucleus], text[nucleus + 1:boundary], text[boundary:following], line.is_heavy(i))
+    return ends
+
+
+def reshuffle_line(hypotactic, muta_cum_liquida=True):
+    '''
+    Reshuffles one raw line (see above), resolving muta cum liquida clusters by the scansion
+    unless muta_cum_liquida is False. Returns (outcome, line), where outcome is one of
+    'empty', 'length_error', 'unchanged', 'updated' or 'realigned' (updated, although the syllabifier
+    counts another number of syllables), and line is None for length errors.
+    '''
+    hypotactic = hypotactic.strip()
+    hypotactic = re.sub(greek_punctuation_except_scansion, '', hypotactic)
+    hypotactic = hypotactic.replace("\xa0", " ") # non-breaking space
+    hypotactic = doubled_bracket_pattern.sub(r'\1', hypotactic)
+    if not hypotactic:
+        return 'empty', ''
+    
+    line = Line.parse(hypotactic)
+    if tracer.debug:
+        tracer.log(f"hypotactic: {[syllable.text for syllable in line]}")
+
+    # Build scriptio continua
+    cleaned_line = re.sub(greek_punctuation, '', hypotactic)
+    cleaned_line = cleaned_line.replace(" ", "")
+    syllabifier_sylls = syllabify_line(cleaned_line) if cleaned_line else [] # syllabifier returns None for lines of only brackets, e.g. "[]"
+    if tracer.debug:
+        tracer.log(f'syllabifier: {syllabifier_sylls}')
+
+    text, hypotactic_ends = line.letters()
+    if not len(line) or text != cleaned_line or line.text.replace(' ', '') != text or ''.join(syllabifier_sylls) != cleaned_line:
+        # Text (e.g. an empty [] left by the punctuation) outside the brackets, stray brackets inside them,
+        # or a syllabifier that changed the text
+        if tracer.debug:
+            tracer.log(f"[text mismatch] {text} ≠ {''.join(syllabifier_sylls)}\n→ {hypotactic}")
+        return 'length_error', None
+
+    syllabifier_ends = []
+    offset = 0
+    for syll in syllabifier_sylls:
+        offset += len(syll)
+        syllabifier_ends.append(offset)
+
+    vowels = vowel_offsets(text)
+    ends = align_boundaries(text, hypotactic_ends, syllabifier_ends, vowels)
+    if ends is None:
+        if tracer.debug:
+            tracer.log(f"[alignment failed] {hypotactic_ends} vs {syllabifier_ends}\n→ {hypotactic}")
+        return 'length_error', None
+
+    if muta_cum_liquida:
+        resolve_muta_cum_liquida(text, ends, line, vowels)
+
+    shuffled = str(line.with_boundaries(ends))
+    if tracer.debug:
+        tracer.log(f"\033[32mShuffled line: {shuffled}\033[0m\n")
+
+    if shuffled == hypotactic:
+        return 'unchanged', hypotactic
+    if len(line) != len(syllabifier_sylls):
+        if tracer.debug:
+            tracer.log(f"[length mismatch, realigned] {len(line)} ≠ {len(syllabifier_sylls)}")
+        return 'realigned', shuffled
+    return 'updated', shuffled
+
+
+def reshuffle_chunk(lines, muta_cum_liquida=True, profiling=False):
+    '''
+    Process pool worker: reshuffles a chunk of lines, returning the results in order, the chunk's counters,
+    the worker's cache updates (see grc_cache.take_updates) and, when profiling, its timings (see
+    Tracer.take_profile).
+    '''
+    tracer.profiling = profiling
+    results = [tracer.profile('reshuffle', reshuffle_line, line, muta_cum_liquida) for line in lines]
+    counters = Counter(OUTCOME_COUNTERS[outcome] for outcome, _ in results)
+    return results, counters, take_updates(), tracer.take_profile()
+
+
+def reshuffle_lines(lines, jobs=1, chunk_size=1000, muta_cum_liquida=True):
+    '''
+    Yields (line, outcome, shuffled) for every line, in input order, counting the outcomes in tracer.counters.
+    With jobs > 1, chunks of chunk_size lines are reshuffled in a process pool (see parallel.py), and the
+    workers' counters, cache entries and timings are merged as the chunks come back. The output is identical to the serial one.
+    '''
+    if jobs <= 1:
+        for line in lines:
+            outcome, shuffled = tracer.profile('reshuffle', reshuffle_line, line, muta_cum_liquida)
+            tracer.count(OUTCOME_COUNTERS[outcome])
+            yield line, outcome, shuffled
+        return
+
+    worker = partial(reshuffle_chunk, muta_cum_liquida=muta_cum_liquida, profiling=tracer.profiling)
+    for chunk, (results, counters, updates, profile) in map_chunks(worker, lines, jobs, chunk_size, track_updates):
+        tracer.counters.update(counters)
+        merge_updates(updates)
+        tracer.merge_profile(profile)
+        for line, (outcome, shuffled) in zip(chunk, results):
+            yield line, outcome, shuffled
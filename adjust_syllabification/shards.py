@@ -0,0 +1,362 @@
+'''
+The corpus split into shards per work and metre, so that a job needing only, say, the iambic
+trimeters of tragedy reads only those:
+
+python adjust_syllabification/shards.py write                 # all of hypotactic_htmls_greek/
+python adjust_syllabification/shards.py list --metre ia6g
+python adjust_syllabification/shards.py read --metre ia6g --work persians --lines 10:20
+python adjust_syllabification/shards.py read --metre ia6g --work persians --numbers 176:200 --with-numbers
+
+Every line of every HTML file goes through the same stages as in pipeline.py, and the output of
+every stage is kept, shard by shard:
+
+shards/raw/<work>/<metre>.txt        as in hypotactic_all_raw.txt
+shards/shuffled/<work>/<metre>.txt   as in hypotactic_all_shuffled.txt
+shards/cleaned/<work>/<metre>.txt    as in hypotactic_all_shuffled_cleaned.txt
+
+The metre is the line's data-metre (e.g. hexameter, ia6g or an4), percent-encoded in the file name.
+Next to every shard, <metre>.numbers has a row for each of its lines with the line's position in
+its work (0-based, counting the lines of all metres, as in the raw stage) and its data-number, which
+need not be a number (e.g. 17b or 97-95), so that a line can be traced back to the HTML even where
+metres interleave.
+
+shards/manifest.json lists for every shard its line count, size and sha256 (of the lines and of
+the numbers), the data-number of its first and last line, and the byte offset of every
+OFFSET_STEP-th line, so that a line range can be read by seeking close to it rather than from the
+start of the shard. From Python:
+
+reader = ShardReader()
+for shard in reader.shards('cleaned', metres=['ia6g']):
+    lines = reader.read_lines(shard, 100, 200)
+    start, stop = reader.number_range(shard, '176', '200')
+'''
+
+from collections import namedtuple
+from pathlib import Path
+from urllib.parse import quote
+import argparse
+import hashlib
+import json
+import sys
+
+import grc_cache
+import pipeline
+import tracing
+from grc_cache import load_caches, save_caches
+from hypotactic_html import iter_formatted_lines
+from tracing import tracer
+
+SHARD_DIR = Path(__file__).resolve().parent / 'shards'
+STAGES = ['raw', 'shuffled', 'cleaned']
+OFFSET_STEP = 256
+UNKNOWN_METRE = 'unknown'
+
+Shard = namedtuple('Shard', ['stage', 'work', 'metre', 'path', 'lines', 'bytes', 'sha256', 'first_number', 'last_number', 'offsets',
+                             'numbers', 'numbers_sha256'])
+
+
+def shard_path(stage, work, metre):
+    return Path(stage) / work / (quote(metre, safe='') + '.txt')
+
+
+def numbers_path(path):
+    return Path(path).with_suffix('.numbers')
+
+
+class ShardFile:
+    '''
+    One shard being written: counts lines and bytes, hashes, and records the offsets and the numbers
+    of the lines as it goes.
+    '''
+
+    def __init__(self, root, stage, work, metre):
+        self.stage = stage
+        self.work = work
+        self.metre = metre
+        self.path = shard_path(stage, work, metre)
+        (root / self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.f = open(root / self.path, 'wb')
+        self.hash = hashlib.sha256()
+        self.numbers_path = numbers_path(self.path)
+        self.numbers_f = open(root / self.numbers_path, 'wb')
+        self.numbers_hash = hashlib.sha256()
+        self.lines = 0
+        self.bytes = 0
+        self.first_number = None
+        self.last_number = None
+        self.offsets = []
+
+    def write(self, line, number, position):
+        if self.lines % OFFSET_STEP == 0:
+            self.offsets.append(self.bytes)
+        data = (line + '\n').encode('utf-8')
+        self.f.write(data)
+        self.hash.update(data)
+        data = f"{'' if position is None else position}\t{number or ''}\n".encode('utf-8')
+        self.numbers_f.write(data)
+        self.numbers_hash.update(data)
+        self.bytes += len(data)
+        self.lines += 1
+        if self.first_number is None:
+            self.first_number = number
+        self.last_number = number
+
+    def close(self):
+        self.f.close()
+        self.numbers_f.close()
+        return Shard(self.stage, self.work, self.metre, self.path.as_posix(), self.lines, self.bytes,
+                     self.hash.hexdigest(), self.first_number, self.last_number, self.offsets,
+                     self.numbers_path.as_posix(), self.numbers_hash.hexdigest())
+
+
+class ShardWriter:
+    '''
+    Writes lines to the shard of their stage, work and metre. Works are written one at a time,
+    so only the shards of the current work are open. A work that is written replaces all its old
+    shards, in every stage, including those of metres (or stages) it no longer has lines in.
+    '''
+
+    def __init__(self, root=SHARD_DIR):
+        self.root = Path(root)
+        self.open = {}
+        self.work = None
+        self.works = set()
+        self.done = []
+
+    def begin_work(self, work):
+        self.close_work()
+        self.work = work
+        self.works.add(work)
+
+    def write(self, stage, work, metre, line, number=None, position=None):
+        key = (stage, work, metre)
+        shard = self.open.get(key)
+        if shard is None:
+            if work != self.work:
+                self.begin_work(work)
+            shard = self.open[key] = ShardFile(self.root, stage, work, metre)
+        shard.write(line, number, position)
+
+    def close_work(self):
+        for shard in self.open.values():
+            self.done.append(shard.close())
+        self.open = {}
+
+    def remove_stale(self):
+        '''
+        Deletes the shard files of the written works that were not written this time.
+        '''
+        written = {path for shard in self.done for path in (shard.path, shard.numbers)}
+        for work in self.works:
+            for stage in STAGES:
+                directory = self.root / stage / work
+                if not directory.is_dir():
+                    continue
+                for path in list(directory.iterdir()):
+                    if path.relative_to(self.root).as_posix() not in written:
+                        path.unlink()
+                if not any(directory.iterdir()):
+                    directory.rmdir()
+
+    def close(self):
+        '''
+        Closes the open shards and writes the manifest, keeping the entries of works not written this time.
+        '''
+        self.close_work()
+        self.remove_stale()
+        manifest = load_manifest(self.root)
+        kept = [shard for shard in manifest if shard.work not in self.works]
+        shards = sorted(kept + self.done, key=lambda shard: (STAGES.index(shard.stage), shard.work, shard.metre))
+        save_manifest(shards, self.root)
+        return shards
+
+
+def load_manifest(root=SHARD_DIR):
+    path = Path(root) / 'manifest.json'
+    if not path.exists():
+        return []
+    with open(path, encoding='utf-8') as f:
+        saved = json.load(f)
+    # Shards written before the numbers were kept have none, and show up as stale in verify()
+    return [Shard(**{'numbers': None, 'numbers_sha256': None, **entry}) for entry in saved['shards']]
+
+
+def save_manifest(shards, root=SHARD_DIR):
+    path = Path(root) / 'manifest.json'
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'offset_step': OFFSET_STEP, 'shards': [shard._asdict() for shard in shards]}, f, indent=1, ensure_ascii=False)
+    tmp.replace(path)
+
+
+def write_shards(html_files, root=SHARD_DIR):
+    '''
+    Runs every line of html_files through the stages, writing the output of each to its shard.
+    '''
+    writer = ShardWriter(root)
+    for html_file in html_files:
+        work = Path(html_file).stem
+        writer.begin_work(work)
+        for position, (attrs, part) in enumerate(iter_formatted_lines(html_file)):
+            number = attrs.get('data-number')
+            metre = attrs.get('data-metre') or UNKNOWN_METRE
+            writer.write('raw', work, metre, part, number, position)
+            shuffled = pipeline.reshuffle(part)
+            if shuffled is None:
+                continue
+            writer.write('shuffled', work, metre, shuffled, number, position)
+            if pipeline.check_brackets(shuffled) is None:
+                continue
+            writer.write('cleaned', work, metre, shuffled, number, position)
+        tracer.info(f"Sharded {work}")
+    return writer.close()
+
+
+class ShardReader:
+    '''
+    Finds shards in the manifest, and reads them in whole or in part.
+    '''
+
+    def __init__(self, root=SHARD_DIR):
+        self.root = Path(root)
+        self.manifest = load_manifest(self.root)
+        self.offset_step = OFFSET_STEP
+        path = self.root / 'manifest.json'
+        if path.exists():
+            with open(path, encoding='utf-8') as f:
+                self.offset_step = json.load(f)['offset_step']
+
+    def shards(self, stage='cleaned', works=None, metres=None):
+        return [shard for shard in self.manifest
+                if shard.stage == stage
+                and (not works or shard.work in works)
+                and (not metres or shard.metre in metres)]
+
+    def read_lines(self, shard, start=0, stop=None):
+        '''
+        Lines start to stop (0-based, stop exclusive) of shard, without their newlines.
+        '''
+        stop = shard.lines if stop is None else min(stop, shard.lines)
+        if start >= stop:
+            return []
+        checkpoint = start // self.offset_step
+        lines = []
+        with open(self.root / shard.path, 'rb') as f:
+            f.seek(shard.offsets[checkpoint])
+            for index in range(checkpoint * self.offset_step, stop):
+                line = f.readline()
+                if index >= start:
+                    lines.append(line.decode('utf-8').rstrip('\n'))
+        return lines
+
+    def read_numbers(self, shard, start=0, stop=None):
+        '''
+        (position in the work, data-number) of lines start to stop of shard, as in read_lines.
+        '''
+        with open(self.root / shard.numbers, encoding='utf-8') as f:
+            rows = [line.rstrip('\n').split('\t') for line in f]
+        return [(int(position) if position else None, number or None) for position, number in rows[start:stop]]
+
+    def number_range(self, shard, first, last):
+        '''
+        (start, stop) for read_lines, from the first line of shard numbered first to the last one numbered
+        last, both data-numbers as strings. Raises KeyError if the shard has no such line.
+        '''
+        numbers = [number for _, number in self.read_numbers(shard)]
+        for number in (first, last):
+            if number not in numbers:
+                raise KeyError(f"no line numbered {number} in {shard.path}")
+        return numbers.index(first), len(numbers) - numbers[::-1].index(last)
+
+    def read(self, stage='cleaned', works=None, metres=None):
+        '''
+        Yields (shard, line) for every line of the matching shards.
+        '''
+        for shard in self.shards(stage, works, metres):
+            with open(self.root / shard.path, encoding='utf-8') as f:
+                for line in f:
+                    yield shard, line.rstrip('\n')
+
+    def verify(self, stage=None):
+        '''
+        The shards whose contents no longer match their hash in the manifest.
+        '''
+        stale = []
+        for shard in self.manifest:
+            if stage is not None and shard.stage != stage:
+                continue
+            if shard.numbers is None:
+                stale.append(shard)
+                continue
+            for path, digest in ((self.root / shard.path, shard.sha256), (self.root / shard.numbers, shard.numbers_sha256)):
+                if not path.exists() or hashlib.sha256(path.read_bytes()).hexdigest() != digest:
+                    stale.append(shard)
+                    break
+        return stale
+
+
+def parse_range(text):
+    start, _, stop = text.partition(':')
+    return int(start or 0), int(stop) if stop else None
+
+
+def parse_numbers(text):
+    first, _, last = text.partition(':')
+    return first, last or first
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write, list and read the corpus sharded by work and metre.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    write = commands.add_parser('write', help='(re)write the shards of the given works')
+    write.add_argument('html_files', nargs='*', type=Path, help=f'HTML files to shard (default: all of {pipeline.HTML_DIR.name}/)')
+    grc_cache.add_arguments(write)
+    tracing.add_arguments(write)
+
+    for name, description in (('list', 'list the matching shards'), ('read', 'print the lines of the matching shards')):
+        command = commands.add_parser(name, help=description)
+        command.add_argument('--stage', choices=STAGES, default='cleaned')
+        command.add_argument('--work', action='append', help='only this work (may be repeated), e.g. persians')
+        command.add_argument('--metre', action='append', help='only this metre (may be repeated), e.g. ia6g')
+    lines = commands.choices['read'].add_mutually_exclusive_group()
+    lines.add_argument('--lines', metavar='START:STOP', help='only these lines of every shard, 0-based, e.g. 10:20')
+    lines.add_argument('--numbers', metavar='FIRST:LAST', help='only the lines of every shard from data-number FIRST to LAST, both included, e.g. 176:200')
+    commands.choices['read'].add_argument('--with-numbers', action='store_true', help='print the position in the work and the data-number before every line')
+    commands.choices['list'].add_argument('--verify', action='store_true', help='check the shards against their hashes')
+
+    args = parser.parse_args()
+
+    if args.command == 'write':
+        tracing.configure(args)
+        if args.persist_cache:
+            load_caches()
+        shards = write_shards(args.html_files or sorted(pipeline.HTML_DIR.glob('*.html')))
+        tracer.info(f"Done! {len(shards)} shards in {SHARD_DIR}")
+        if args.persist_cache:
+            save_caches()
+        tracing.finish(args)
+        sys.exit()
+
+    reader = ShardReader()
+    if args.command == 'list':
+        stale = {shard.path for shard in reader.verify(args.stage)} if args.verify else set()
+        for shard in reader.shards(args.stage, args.work, args.metre):
+            print(f"{shard.path}\t{shard.lines} lines\t{shard.bytes} bytes\t{shard.first_number}-{shard.last_number}" + ('\tSTALE' if shard.path in stale else ''))
+        sys.exit(1 if stale else 0)
+
+    start, stop = parse_range(args.lines) if args.lines else (0, None)
+    for shard in reader.shards(args.stage, args.work, args.metre):
+        if args.numbers:
+            try:
+                start, stop = reader.number_range(shard, *parse_numbers(args.numbers))
+            except KeyError as e:
+                print(f"Skipping {shard.path}: {e.args[0]}", file=sys.stderr)
+                continue
+        lines = reader.read_lines(shard, start, stop)
+        if args.with_numbers:
+            for (position, number), line in zip(reader.read_numbers(shard, start, stop), lines):
+                print(f"{position}\t{number or ''}\t{line}")
+        else:
+            for line in lines:
+                print(line)
@@ -0,0 +1,169 @@
+'''
+Instrumentation shared by the scripts, quiet by default:
+
+--debug          running commentary of every syllable (what used to be printed unconditionally)
+--trace FILE     one JSON record per processed line, written to FILE (JSONL)
+--profile        time spent in grc_utils calls versus our own code, per stage
+--metrics FILE   counters (e.g. length_errors, updated, unchanged), timings and cache stats as JSON
+
+The hot paths guard their commentary with
+
+if tracer.debug:
+    tracer.log(f"...")
+
+so that nothing is even formatted unless --debug is given.
+'''
+
+from collections import Counter, defaultdict
+import json
+import time
+
+QUIET = 0
+INFO = 1
+DEBUG = 2
+
+
+class Tracer:
+
+    def __init__(self):
+        self.level = INFO
+        self.debug = False
+        self.profiling = False
+        self.records = None
+        self.counters = Counter()
+        self.seconds = defaultdict(float)
+        self.grc_utils_seconds = defaultdict(float)
+        self.grc_utils_calls = Counter()
+        self.stage = None
+
+    def set_level(self, level):
+        self.level = level
+        self.debug = level >= DEBUG
+
+    def log(self, message, level=DEBUG):
+        if self.level >= level:
+            print(message)
+
+    def info(self, message):
+        self.log(message, INFO)
+
+    def open_records(self, path):
+        self.records = open(path, 'w', encoding='utf-8')
+
+    def record(self, **fields):
+        '''
+        Writes one structured record to the --trace file, if any.
+        '''
+        if self.records is not None:
+            self.records.write(json.dumps(fields, ensure_ascii=False) + '\n')
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def profile(self, stage, fn, *args):
+        '''
+        Calls fn(*args); when profiling, its time is added to stage, and grc_utils calls made
+        meanwhile are attributed to stage as well.
+        '''
+        if not self.profiling:
+            return fn(*args)
+        previous = self.stage
+        self.stage = stage
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.seconds[stage] += time.perf_counter() - start
+            self.stage = previous
+
+    def grc_utils(self, fn, *args):
+        '''
+        Calls the grc_utils function fn(*args), timing it when profiling.
+        '''
+        if not self.profiling:
+            return fn(*args)
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.grc_utils_seconds[self.stage] += time.perf_counter() - start
+            self.grc_utils_calls[fn.__name__] += 1
+
+    def take_profile(self):
+        '''
+        In a worker, the timings and grc_utils call counts since the last call, to be added to the
+        parent's with merge_profile(); otherwise these would be lost with the worker.
+        '''
+        profile = (dict(self.seconds), dict(self.grc_utils_seconds), dict(self.grc_utils_calls))
+        self.seconds.clear()
+        self.grc_utils_seconds.clear()
+        self.grc_utils_calls.clear()
+        return profile
+
+    def merge_profile(self, profile):
+        seconds, grc_utils_seconds, grc_utils_calls = profile
+        for stage, value in seconds.items():
+            self.seconds[stage] += value
+        for stage, value in grc_utils_seconds.items():
+            self.grc_utils_seconds[stage] += value
+        self.grc_utils_calls.update(grc_utils_calls)
+
+    def profile_report(self):
+        report = {}
+        for stage, seconds in self.seconds.items():
+            grc_utils_seconds = self.grc_utils_seconds.get(stage, 0.0)
+            report[stage] = {
+                'seconds': seconds,
+                'grc_utils_seconds': grc_utils_seconds,
+                'own_seconds': seconds - grc_utils_seconds,
+            }
+        return report
+
+    def print_profile(self):
+        for stage, report in self.profile_report().items():
+            share = report['grc_utils_seconds'] / report['seconds'] if report['seconds'] else 0
+            print(f"{stage}: {report['seconds']:.2f}s, of which grc_utils {report['grc_utils_seconds']:.2f}s ({share:.1%}) and own code {report['own_seconds']:.2f}s")
+        for name, calls in self.grc_utils_calls.most_common():
+            print(f"  {name}: {calls} calls")
+
+    def metrics(self):
+        from grc_cache import cache_stats  # grc_cache imports this module
+        return {
+            'counters': dict(self.counters),
+            'profile': self.profile_report(),
+            'grc_utils_calls': dict(self.grc_utils_calls),
+            'caches': cache_stats(),
+        }
+
+    def close(self):
+        if self.records is not None:
+            self.records.close()
+            self.records = None
+
+
+tracer = Tracer()
+
+
+def add_arguments(parser):
+    parser.add_argument('--debug', action='store_true', help='print a running commentary of every syllable')
+    parser.add_argument('--quiet', action='store_true', help='print nothing but errors')
+    parser.add_argument('--trace', metavar='FILE', help='write one JSON record per line to FILE')
+    parser.add_argument('--profile', action='store_true', help='report time spent in grc_utils versus our own code')
+    parser.add_argument('--metrics', metavar='FILE', help='write counters, timings and cache stats as JSON to FILE')
+
+
+def configure(args):
+    tracer.set_level(QUIET if args.quiet else DEBUG if args.debug else INFO)
+    tracer.profiling = args.profile
+    if args.trace:
+        tracer.open_records(args.trace)
+
+
+def finish(args):
+    if args.profile:
+        tracer.print_profile()
+    if args.metrics:
+        with open(args.metrics, 'w', encoding='utf-8') as f:
+            json.dump(tracer.metrics(), f, indent=1)
+    tracer.close()
+
@@ -0,0 +1,250 @@
+'''
+Indexed search over the scansions in tsv/, e.g. every hexameter with a spondaic fifth foot:
+
+python tsv_index.py --metre "dactylic hexameter" --pattern='---[-u]$'
+
+or every line ending in a uu-- word, in the first book of the Iliad only:
+
+python tsv_index.py --shape=' uu--$' --work iliad1
+
+(Use --pattern=... rather than --pattern ..., since patterns usually start with a dash.)
+
+Every tsv row is text, weight pattern (words separated by spaces), metre and caesurae. The index keeps
+the weight patterns of all works in two big strings, one line per row, with and without the word
+divisions, so that a pattern query is a single regex scan in C; metres and caesurae are inverted
+indices of row ids. The built index is saved in tsv/.index.pickle together with the hash of every
+tsv, so that a query only loads it; when a tsv changes, only that work is re-read.
+'''
+
+from array import array
+from bisect import bisect_right
+from collections import defaultdict, namedtuple
+from pathlib import Path
+import argparse
+import pickle
+import re
+import sys
+import time
+
+from adjust_syllabification.fingerprints import file_hash
+
+TSV_DIR = Path(__file__).resolve().parent / 'tsv'
+INDEX_FILE = TSV_DIR / '.index.pickle'
+INDEX_VERSION = 2
+
+Row = namedtuple('Row', ['work', 'line', 'text', 'pattern', 'metre', 'caesurae'])
+
+
+def read_tsv(path):
+    '''
+    The rows of one tsv file as (text, pattern, metre, caesurae) tuples, caesurae being a tuple of names.
+    '''
+    rows = []
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for row in f:
+            fields = row.rstrip('\n').split('\t')
+            if len(fields) < 4:
+                fields += [''] * (4 - len(fields))
+            # A few texts contain a tab themselves
+            text = '\t'.join(fields[:-3])
+            pattern, metre, caesurae = fields[-3:]
+            caesurae = tuple(c.strip() for c in caesurae.split(',') if c.strip())
+            rows.append((text, pattern, metre.strip(), caesurae))
+    return rows
+
+
+class TsvIndex:
+    '''
+    The rows of all works in columns: the texts, patterns, shapes and caesurae each in one big string,
+    one line per row, and the metres as codes, so that the index pickles and loads as a few strings
+    and arrays. Row tuples are only made for the rows a search returns (see row()).
+    '''
+
+    def __init__(self, works):
+        '''
+        works: {work: rows}, as returned by read_tsv.
+        '''
+        self.works = []
+        self.work_ranges = {}
+        self.work_starts = array('I')
+        self.metre_names = []
+        self.metres = array('H')
+        metre_codes = {}
+        by_metre = defaultdict(lambda: array('I'))
+        by_caesura = defaultdict(lambda: array('I'))
+        texts = []
+        shapes = []
+        caesura_lists = []
+        for work in sorted(works):
+            start = len(self.metres)
+            for text, pattern, metre, caesurae in works[work]:
+                row_id = len(self.metres)
+                texts.append(text)
+                shapes.append(pattern)
+                caesura_lists.append(', '.join(caesurae))
+                if metre not in metre_codes:
+                    metre_codes[metre] = len(self.metre_names)
+                    self.metre_names.append(metre)
+                self.metres.append(metre_codes[metre])
+                by_metre[metre].append(row_id)
+                for caesura in caesurae:
+                    by_caesura[caesura].append(row_id)
+            self.works.append(work)
+            self.work_ranges[work] = range(start, len(self.metres))
+            self.work_starts.append(start)
+        self.by_metre = dict(by_metre)
+        self.by_caesura = dict(by_caesura)
+        self.texts, self.text_starts = self._blob(texts)
+        self.caesurae, self.caesura_starts = self._blob(caesura_lists)
+        self.patterns, self.pattern_starts = self._blob([shape.replace(' ', '') for shape in shapes])
+        self.shapes, self.shape_starts = self._blob(shapes)
+
+    def __len__(self):
+        return len(self.metres)
+
+    def rows_of(self, work):
+        '''
+        The rows of work as read_tsv returns them, e.g. to build a new index with.
+        '''
+        return [self.row(i)[2:] for i in self.work_ranges[work]]
+
+    def row(self, row_id):
+        work = self.works[bisect_right(self.work_starts, row_id) - 1]
+        caesurae = self._field(self.caesurae, self.caesura_starts, row_id)
+        return Row(work, row_id - self.work_ranges[work].start + 1,
+                   self._field(self.texts, self.text_starts, row_id),
+                   self._field(self.shapes, self.shape_starts, row_id),
+                   self.metre_names[self.metres[row_id]],
+                   tuple(caesurae.split(', ')) if caesurae else ())
+
+    @staticmethod
+    def _blob(strings):
+        starts = array('I')
+        offset = 0
+        for s in strings:
+            starts.append(offset)
+            offset += len(s) + 1
+        return '\n'.join(strings), starts
+
+    @staticmethod
+    def _field(blob, starts, row_id):
+        end = starts[row_id + 1] - 1 if row_id + 1 < len(starts) else len(blob)
+        return blob[starts[row_id]:end]
+
+    @staticmethod
+    def _scan(regex, blob, starts):
+        '''
+        Row ids of every row with a match of regex, which is applied per row (^ and $ are row anchors).
+        A match that runs on into the next row (e.g. of u\s-) does not count, and the rows it spans
+        are matched on their own instead, as it may have hidden matches within them.
+        '''
+        regex = re.compile(regex, re.MULTILINE)
+        ids = set()
+        for match in regex.finditer(blob):
+            first = bisect_right(starts, match.start()) - 1
+            if '\n' not in match.group():
+                ids.add(first)
+                continue
+            last = bisect_right(starts, match.end() - 1) - 1
+            for row_id in range(first, last + 1):
+                end = starts[row_id + 1] - 1 if row_id + 1 < len(starts) else len(blob)
+                if regex.search(blob, starts[row_id], end):
+                    ids.add(row_id)
+        return ids
+
+    def search(self, pattern=None, shape=None, metre=None, caesura=None, works=None):
+        '''
+        Rows matching all of the given criteria, in corpus order:
+
+        pattern: regex over the weights without word divisions, e.g. '---[-u]$'
+        shape: regex over the weights with word divisions as spaces, e.g. ' uu--$'
+        metre: metre name, e.g. 'dactylic hexameter'
+        caesura: caesura name, e.g. 'hepthemimeral'
+        works: names of the works to search, e.g. ['iliad1', 'iliad2']
+        '''
+        candidates = None
+
+        def narrow(ids):
+            nonlocal candidates
+            candidates = set(ids) if candidates is None else candidates.intersection(ids)
+
+        if works:
+            unknown = set(works) - set(self.work_ranges)
+            if unknown:
+                raise KeyError(f"Unknown works: {', '.join(sorted(unknown))}")
+            narrow({i for work in works for i in self.work_ranges[work]})
+        if metre is not None:
+            narrow(self.by_metre.get(metre, ()))
+        if caesura is not None:
+            narrow(self.by_caesura.get(caesura, ()))
+        if pattern is not None:
+            narrow(self._scan(pattern, self.patterns, self.pattern_starts))
+        if shape is not None:
+            narrow(self._scan(shape, self.shapes, self.shape_starts))
+        if candidates is None:
+            candidates = range(len(self))
+        return [self.row(i) for i in sorted(candidates)]
+
+
+def load_index(tsv_dir=TSV_DIR, index_file=INDEX_FILE):
+    '''
+    Loads the saved index, rebuilding it if a tsv file changed, was added or removed since. Only the
+    changed tsv files are re-read, the rows of the other works are taken from the saved index.
+    '''
+    saved = None
+    if index_file.exists():
+        with open(index_file, 'rb') as f:
+            saved = pickle.load(f)
+        if saved.get('version') != INDEX_VERSION:
+            saved = None
+
+    hashes = {path.stem: file_hash(path) for path in sorted(tsv_dir.glob('*.tsv'))}
+    if saved is not None and saved['hashes'] == hashes:
+        return saved['index']
+
+    works = {}
+    for work, digest in hashes.items():
+        if saved is not None and saved['hashes'].get(work) == digest:
+            works[work] = saved['index'].rows_of(work)
+        else:
+            works[work] = read_tsv(tsv_dir / (work + '.tsv'))
+    index = TsvIndex(works)
+
+    tmp = index_file.with_suffix('.tmp')
+    with open(tmp, 'wb') as f:
+        pickle.dump({'version': INDEX_VERSION, 'hashes': hashes, 'index': index}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp.replace(index_file)
+    return index
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Search the scansions in tsv/ by weight pattern, word shape, metre and caesura.')
+    parser.add_argument('--pattern', help="regex over the weights without word divisions, e.g. '---[-u]$'")
+    parser.add_argument('--shape', help="regex over the weights with spaces between words, e.g. ' uu--$'")
+    parser.add_argument('--metre', help="e.g. 'dactylic hexameter'")
+    parser.add_argument('--caesura', help="e.g. 'hepthemimeral'")
+    parser.add_argument('--work', action='append', help='only search this work (may be repeated), e.g. iliad1')
+    parser.add_argument('--count', action='store_true', help='only print the number of matching lines')
+    parser.add_argument('--list', choices=['works', 'metres', 'caesurae'], help='list the values that can be filtered on')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = load_index()
+    loaded = time.perf_counter()
+
+    if args.list:
+        values = {'works': index.works, 'metres': index.by_metre, 'caesurae': index.by_caesura}[args.list]
+        for value in sorted(values):
+            print(value)
+        sys.exit()
+
+    try:
+        rows = index.search(args.pattern, args.shape, args.metre, args.caesura, args.work)
+    except (KeyError, re.error) as e:
+        sys.exit(f"Error: {e}")
+    searched = time.perf_counter()
+
+    if not args.count:
+        for row in rows:
+            print(f"{row.work}\t{row.line}\t{row.text}\t{row.pattern}\t{row.metre}\t{', '.join(row.caesurae)}")
+    print(f"{len(rows)} lines (index loaded in {(loaded - start) * 1000:.0f} ms, searched in {(searched - loaded) * 1000:.1f} ms)", file=sys.stderr)
@@ -0,0 +1,296 @@
+'''
+Metrical statistics over the scansions in tsv/, computed on NumPy arrays rather than line by line:
+
+python tsv_stats.py feet                    # dactyls and spondees in each foot of the hexameter
+python tsv_stats.py rates --by book         # dactyl and spondee rates of every book (rates --by work: of every work)
+python tsv_stats.py caesurae --by work      # how often each caesura is marked
+python tsv_stats.py word-ends               # where words end in the hexameter, e.g. how well Hermann's bridge holds
+
+The tables are written as CSV (to stdout, or to --output), or are available as DataFrames from
+Python if pandas is installed:
+
+from tsv_stats import Scansions, dactyl_rates
+dactyl_rates(Scansions.load(metre='dactylic hexameter'), by='work').to_dataframe()
+
+Scansions holds the weights of all syllables of the selected lines in one flat array, with the
+offsets of the lines into it (a ragged array); padded() gives them as one row per line. Word-end
+positions are named after the foot and the element the word ends after: 3L is the masculine
+caesura (after the longum of the third foot), 3b the feminine one (after the first breve), 4b
+Hermann's bridge, and 4| the bucolic diaeresis (after the whole fourth foot).
+'''
+
+from pathlib import Path
+import argparse
+import csv
+import re
+import sys
+
+import numpy as np
+
+from tsv_index import load_index
+
+HEAVY = ord('-')
+LIGHT = ord('u')
+SPACE = ord(' ')
+NEWLINE = ord('\n')
+
+DACTYL = 1
+SPONDEE = 2
+TROCHEE = 3  # the sixth foot, with its last syllable light
+FOOT_NAMES = {DACTYL: 'dactyl', SPONDEE: 'spondee', TROCHEE: 'trochee'}
+
+# Elements of a foot, which word ends are counted after
+LONGUM = 0
+FIRST_BREVE = 1
+FOOT_END = 2  # the second breve, or the contracted biceps
+ELEMENT_NAMES = ['L', 'b', '|']
+POSITION_NAMES = [f'{foot}{element}' for foot in range(1, 7) for element in ELEMENT_NAMES]
+
+
+class Table:
+    '''
+    A computed table: column names and rows of values.
+    '''
+
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = rows
+
+    def to_csv(self, f=None):
+        '''
+        Writes the table to the open file f, or returns it as a string if f is None.
+        '''
+        if f is None:
+            from io import StringIO
+            f = StringIO()
+            self.to_csv(f)
+            return f.getvalue()
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(self.columns)
+        writer.writerows(self.rows)
+
+    def to_dataframe(self):
+        import pandas as pd  # only needed for DataFrames
+        return pd.DataFrame(self.rows, columns=self.columns)
+
+
+class Scansions:
+    '''
+    The weights and word ends of a list of tsv rows (see tsv_index.Row) as flat arrays:
+
+    weights: 1 for every heavy and 0 for every light syllable, line after line
+    word_ends: True for every syllable a word ends after
+    line: the row index of every syllable
+    offsets: the index in weights of the first syllable of every row, plus one past the last
+    valid: False for rows whose pattern has characters other than -, u and spaces
+    '''
+
+    def __init__(self, rows):
+        self.rows = rows
+        blob = '\n'.join(row.pattern for row in rows) + '\n'
+        # Every non-ASCII character becomes a single ?, so that chars stays aligned with the patterns
+        chars = np.frombuffer(blob.encode('ascii', 'replace'), dtype=np.uint8)
+        newlines = chars == NEWLINE
+        row_of_char = np.cumsum(newlines) - newlines
+        heavy = chars == HEAVY
+        syllables = heavy | (chars == LIGHT)
+        positions = np.flatnonzero(syllables)
+
+        self.weights = heavy[positions].astype(np.int8)
+        following = chars[positions + 1]  # the blob ends in a newline, so there always is one
+        self.word_ends = (following == SPACE) | (following == NEWLINE)
+        self.line = row_of_char[positions]
+        self.lengths = np.bincount(self.line, minlength=len(rows))
+        self.offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(self.lengths, out=self.offsets[1:])
+
+        self.valid = np.ones(len(rows), dtype=bool)
+        other = ~(syllables | newlines | (chars == SPACE))
+        self.valid[row_of_char[other]] = False
+
+    @classmethod
+    def load(cls, metre=None, works=None):
+        '''
+        The rows of tsv/ in the given metre and works (default: all), via the index of tsv_index.py.
+        '''
+        return cls(load_index().search(metre=metre, works=works))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def padded(self, values=None, fill=-1, width=None):
+        '''
+        values (default: the weights), one per syllable, as a (lines, width) array padded with fill.
+        '''
+        if values is None:
+            values = self.weights
+        if width is None:
+            width = int(self.lengths.max(initial=0))
+        matrix = np.full((len(self), width), fill, dtype=values.dtype)
+        columns = np.arange(len(values)) - self.offsets[self.line]
+        matrix[self.line, columns] = values
+        return matrix
+
+    def groups(self, by):
+        '''
+        Group of every row, as (codes, names): by 'book' every tsv is a group of its own,
+        by 'work' the books of a work (e.g. iliad1 to iliad24) go together.
+        '''
+        if by == 'book':
+            keys = [row.work for row in self.rows]
+        elif by == 'work':
+            keys = [re.sub(r'\d+$', '', row.work) for row in self.rows]
+        else:
+            raise ValueError(f"Cannot group by {by!r}")
+        names, codes = np.unique(np.array(keys, dtype=object), return_inverse=True)
+        return codes.reshape(-1), list(names)
+
+
+def parse_hexameters(scansions):
+    '''
+    Scans every line as a dactylic hexameter, all lines at once, foot by foot. Returns
+
+    feet: (lines, 6) array of DACTYL, SPONDEE or TROCHEE
+    positions: the position of every syllable, foot * 3 + element, as an index of POSITION_NAMES
+    ok: False for lines that are no hexameters, whose feet and positions are meaningless
+    '''
+    n = len(scansions)
+    width = max(int(scansions.lengths.max(initial=0)), 17) + 3
+    weights = scansions.padded(width=width)
+    positions = np.full((n, width), -1, dtype=np.int8)
+    feet = np.zeros((n, 6), dtype=np.int8)
+    rows = np.arange(n)
+    pos = np.zeros(n, dtype=np.int64)
+    ok = scansions.valid.copy()
+
+    for foot in range(5):
+        first = weights[rows, pos]
+        second = weights[rows, pos + 1]
+        third = weights[rows, pos + 2]
+        dactyl = (second == 0) & (third == 0)
+        ok &= (first == 1) & (dactyl | (second == 1))
+        positions[rows, pos] = foot * 3 + LONGUM
+        positions[rows, pos + 1] = np.where(dactyl, foot * 3 + FIRST_BREVE, foot * 3 + FOOT_END)
+        positions[rows[dactyl], pos[dactyl] + 2] = foot * 3 + FOOT_END
+        feet[:, foot] = np.where(dactyl, DACTYL, SPONDEE)
+        pos += np.where(dactyl, 3, 2)
+
+    last = weights[rows, pos + 1]
+    ok &= (weights[rows, pos] == 1) & (last >= 0) & (pos + 2 == scansions.lengths)
+    positions[rows, pos] = 15 + LONGUM
+    positions[rows, pos + 1] = 15 + FOOT_END
+    feet[:, 5] = np.where(last == 1, SPONDEE, TROCHEE)
+
+    # Back to one position per syllable
+    columns = np.arange(len(scansions.weights)) - scansions.offsets[scansions.line]
+    return feet, positions[scansions.line, columns], ok
+
+
+def foot_types(scansions):
+    '''
+    Number of dactyls, spondees and (in the sixth foot) trochees in every foot of the hexameters.
+    '''
+    feet, _, ok = parse_hexameters(scansions)
+    feet = feet[ok]
+    rows = []
+    for foot in range(6):
+        counts = np.bincount(feet[:, foot], minlength=4)
+        total = int(counts.sum())
+        rows.append([foot + 1, int(counts[DACTYL]), int(counts[SPONDEE]), int(counts[TROCHEE]),
+                     round(counts[DACTYL] / total, 4) if total else 0.0])
+    return Table(['foot', 'dactyls', 'spondees', 'trochees', 'dactyl_share'], rows)
+
+
+def dactyl_rates(scansions, by='work'):
+    '''
+    Dactyls and spondees in the first five feet of the hexameters of every work or book.
+    '''
+    feet, _, ok = parse_hexameters(scansions)
+    codes, names = scansions.groups(by)
+    codes, feet = codes[ok], feet[ok, :5]
+    lines = np.bincount(codes, minlength=len(names))
+    dactyls = np.bincount(codes, weights=(feet == DACTYL).sum(axis=1), minlength=len(names))
+    spondees = lines * 5 - dactyls
+    spondaic_fifth = np.bincount(codes, weights=feet[:, 4] == SPONDEE, minlength=len(names))
+    rows = []
+    for i, name in enumerate(names):
+        if not lines[i]:
+            continue
+        rows.append([name, int(lines[i]), int(dactyls[i]), int(spondees[i]),
+                     round(dactyls[i] / (lines[i] * 5), 4), round(dactyls[i] / lines[i], 4), int(spondaic_fifth[i])])
+    return Table([by, 'lines', 'dactyls', 'spondees', 'dactyl_rate', 'dactyls_per_line', 'spondaic_fifth'], rows)
+
+
+def caesurae(scansions, by=None):
+    '''
+    How many lines have each caesura marked in the tsv, overall or per work or book.
+    '''
+    names = sorted({caesura for row in scansions.rows for caesura in row.caesurae})
+    index = {name: i for i, name in enumerate(names)}
+    line_of = np.array([i for i, row in enumerate(scansions.rows) for _ in row.caesurae], dtype=np.int64)
+    caesura_of = np.array([index[c] for row in scansions.rows for c in row.caesurae], dtype=np.int64)
+
+    if by is None:
+        codes, groups = np.zeros(len(scansions), dtype=np.int64), [None]
+    else:
+        codes, groups = scansions.groups(by)
+    lines = np.bincount(codes, minlength=len(groups))
+    counts = np.bincount(codes[line_of] * len(names) + caesura_of, minlength=len(groups) * len(names))
+    counts = counts.reshape(len(groups), len(names))
+
+    rows = []
+    for g, group in enumerate(groups):
+        for c, name in enumerate(names):
+            row = [name, int(counts[g, c]), round(counts[g, c] / lines[g], 4) if lines[g] else 0.0]
+            rows.append(row if by is None else [group] + row)
+    columns = ['caesura', 'lines', 'share']
+    return Table(columns if by is None else [by] + columns, rows)
+
+
+def word_ends(scansions):
+    '''
+    How often a word ends at every position of the hexameter, e.g. 3L (masculine caesura) or 4b (Hermann's bridge).
+    '''
+    _, positions, ok = parse_hexameters(scansions)
+    keep = ok[scansions.line]
+    positions, ends = positions[keep], scansions.word_ends[keep]
+    occupied = np.bincount(positions, minlength=len(POSITION_NAMES))
+    ended = np.bincount(positions, weights=ends, minlength=len(POSITION_NAMES))
+    rows = []
+    for i, name in enumerate(POSITION_NAMES):
+        if occupied[i]:
+            rows.append([name, int(occupied[i]), int(ended[i]), round(ended[i] / occupied[i], 4)])
+    return Table(['position', 'lines', 'word_ends', 'rate'], rows)
+
+
+TABLES = {
+    'feet': foot_types,
+    'rates': dactyl_rates,
+    'caesurae': caesurae,
+    'word-ends': word_ends,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Metrical statistics over the scansions in tsv/.')
+    parser.add_argument('table', choices=list(TABLES))
+    parser.add_argument('--metre', default='dactylic hexameter', help="metre of the lines to count (default: 'dactylic hexameter'; feet, rates and word-ends need it)")
+    parser.add_argument('--work', action='append', help='only count this tsv (may be repeated), e.g. iliad1')
+    parser.add_argument('--by', choices=['work', 'book'], help='for rates and caesurae: one row per work or per book')
+    parser.add_argument('--output', type=Path, help='write the CSV to this file instead of stdout')
+    args = parser.parse_args()
+
+    try:
+        scansions = Scansions.load(args.metre, args.work)
+    except KeyError as e:
+        sys.exit(f"Error: {e}")
+    if args.table in ('rates', 'caesurae') and args.by:
+        table = TABLES[args.table](scansions, args.by)
+    else:
+        table = TABLES[args.table](scansions)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as f:
+            table.to_csv(f)
+    else:
+        table.to_csv(sys.stdout)